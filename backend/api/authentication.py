@@ -0,0 +1,48 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.authentication import TokenAuthentication
+
+TOKEN_CACHE_KEY = 'api:token:{digest}'
+TOKEN_USER_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name',
+    'is_active', 'is_staff', 'is_superuser',
+)
+
+
+def get_token_cache_key(key):
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return TOKEN_CACHE_KEY.format(digest=digest)
+
+
+def invalidate_token(key):
+    cache.delete(get_token_cache_key(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        if settings.TOKEN_AUTH_CACHE_TIMEOUT <= 0:
+            return super().authenticate_credentials(key)
+        cache_key = get_token_cache_key(key)
+        values = cache.get(cache_key)
+        if values is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(
+                cache_key,
+                {field: getattr(user, field) for field in TOKEN_USER_FIELDS},
+                settings.TOKEN_AUTH_CACHE_TIMEOUT
+            )
+            return user, token
+        user_model = get_user_model()
+        field_names = [
+            field.attname for field in user_model._meta.concrete_fields
+            if field.attname in values
+        ]
+        user = user_model.from_db(
+            DEFAULT_DB_ALIAS, field_names,
+            [values[field_name] for field_name in field_names]
+        )
+        return user, self.get_model()(key=key, user=user)
@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+from functools import partial
+
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base, creation
+from django.db.utils import OperationalError
+from psycopg2 import extensions
+
+from api.metrics import DB_POOL_TIMEOUTS, DB_POOL_WAIT, DB_RECONNECTS
+
+DEFAULT_POOL_MAX_SIZE = 10
+DEFAULT_POOL_TIMEOUT = 30
+
+
+class ConnectionPool:
+    def __init__(self, alias, max_size, timeout, check_age=0):
+        self.alias = alias
+        self.timeout = timeout
+        self.check_age = check_age
+        self.closed = False
+        self._semaphore = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._idle = []
+
+    def acquire(self, connect):
+        labels = {'database': self.alias}
+        start = time.perf_counter()
+        acquired = self._semaphore.acquire(timeout=self.timeout)
+        DB_POOL_WAIT.observe(labels, time.perf_counter() - start)
+        if not acquired:
+            DB_POOL_TIMEOUTS.inc(labels)
+            raise OperationalError(
+                f'Пул соединений {self.alias} исчерпан: нет свободного '
+                f'соединения за {self.timeout} с.'
+            )
+        try:
+            while True:
+                with self._lock:
+                    connection, idle_since = (
+                        self._idle.pop() if self._idle else (None, None)
+                    )
+                if connection is None:
+                    return connect()
+                if (time.monotonic() - idle_since <= self.check_age
+                        or self.is_usable(connection)):
+                    return connection
+                DB_RECONNECTS.inc(labels)
+                self.discard(connection)
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    def release(self, connection, discard=False):
+        try:
+            if connection.closed:
+                return
+            if discard or self.closed:
+                self.discard(connection)
+                return
+            if (connection.get_transaction_status()
+                    != extensions.TRANSACTION_STATUS_IDLE):
+                connection.rollback()
+            with self._lock:
+                self._idle.append((connection, time.monotonic()))
+        except Exception:
+            self.discard(connection)
+        finally:
+            self._semaphore.release()
+
+    def is_usable(self, connection):
+        if connection.closed:
+            return False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Exception:
+            return False
+        return True
+
+    def close_all(self):
+        with self._lock:
+            self.closed = True
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self.discard(connection)
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool_key(alias, conn_params):
+    return (alias, os.getpid(), repr(sorted(conn_params.items())))
+
+
+def get_pool(alias, settings_dict, conn_params):
+    key = get_pool_key(alias, conn_params)
+    with _pools_lock:
+        if key not in _pools:
+            options = settings_dict.get('POOL', {})
+            _pools[key] = ConnectionPool(
+                alias,
+                options.get('MAX_SIZE', DEFAULT_POOL_MAX_SIZE),
+                options.get('TIMEOUT', DEFAULT_POOL_TIMEOUT),
+                settings_dict.get('CONN_HEALTH_CHECK_AGE', 0),
+            )
+        return _pools[key]
+
+
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+    connection_pool = None
+    connection_pool_key = None
+
+    def get_new_connection(self, conn_params):
+        connect = partial(super().get_new_connection, conn_params)
+        if self.alias == NO_DB_ALIAS:
+            self.connection_pool = None
+            return connect()
+        self.connection_pool = get_pool(
+            self.alias, self.settings_dict, conn_params
+        )
+        self.connection_pool_key = get_pool_key(self.alias, conn_params)
+        return self.connection_pool.acquire(connect)
+
+    def _close(self):
+        if self.connection is None:
+            return
+        if self.connection_pool is None:
+            super()._close()
+            return
+        settings_changed = self.connection_pool_key != get_pool_key(
+            self.alias, self.get_connection_params()
+        )
+        self.connection_pool.release(
+            self.connection, discard=settings_changed
+        )
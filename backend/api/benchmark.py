@@ -0,0 +1,216 @@
+import random
+import time
+import tracemalloc
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
+                            RecipeIngredient, RecipeTag, ShoppingCart,
+                            ShoppingCartTotals, Tag)
+from users.models import Follow, User
+
+BENCHMARK_IMAGE = 'recipes/benchmark.png'
+LATENCY_NOISE_MS = 1
+
+
+def generate_data(users_count, recipes_count, ingredients_count=200,
+                  tags_count=6, follows_per_user=20, favorites_per_user=20,
+                  cart_per_user=10, seed=0):
+    rng = random.Random(seed)
+    password = make_password('benchmark-password')
+    User.objects.bulk_create(
+        User(
+            username=f'benchmark{index}',
+            email=f'benchmark{index}@example.com',
+            first_name=f'Имя{index}',
+            last_name=f'Фамилия{index}',
+            password=password,
+        )
+        for index in range(users_count)
+    )
+    users = list(User.objects.order_by('id'))
+    Tag.objects.bulk_create(
+        Tag(name=f'Тэг {index}', color=f'#{index:06X}', slug=f'tag{index}')
+        for index in range(tags_count)
+    )
+    tags = list(Tag.objects.order_by('id'))
+    Ingredient.objects.bulk_create(
+        Ingredient(
+            name=f'ингредиент {index}',
+            measurement_unit=rng.choice(('г', 'мл', 'шт.', 'ст. л.')),
+        )
+        for index in range(ingredients_count)
+    )
+    ingredients = list(Ingredient.objects.order_by('id'))
+    Recipe.objects.bulk_create(
+        Recipe(
+            author=rng.choice(users),
+            name=f'Рецепт {index}',
+            image=BENCHMARK_IMAGE,
+            text=f'Описание рецепта {index}',
+            cooking_time=rng.randint(1, 120),
+        )
+        for index in range(recipes_count)
+    )
+    recipes = list(Recipe.objects.order_by('id'))
+
+    recipe_tags = []
+    recipe_ingredients = []
+    for recipe in recipes:
+        recipe_tags.extend(
+            RecipeTag(recipe=recipe, tag=tag)
+            for tag in rng.sample(tags, rng.randint(1, min(3, len(tags))))
+        )
+        recipe_ingredients.extend(
+            RecipeIngredient(
+                recipe=recipe, ingredient=ingredient,
+                amount=rng.randint(1, 500)
+            )
+            for ingredient in rng.sample(
+                ingredients, rng.randint(3, min(10, len(ingredients)))
+            )
+        )
+    RecipeTag.objects.bulk_create(recipe_tags)
+    RecipeIngredient.objects.bulk_create(recipe_ingredients)
+
+    follows = []
+    favorites = []
+    carts = []
+    for user in users:
+        authors = [author for author in users if author != user]
+        follows.extend(
+            Follow(user=user, author=author)
+            for author in rng.sample(
+                authors, min(follows_per_user, len(authors))
+            )
+        )
+        favorites.extend(
+            FavoriteRecipe(user=user, recipe=recipe)
+            for recipe in rng.sample(
+                recipes, min(favorites_per_user, len(recipes))
+            )
+        )
+        carts.extend(
+            ShoppingCart(user=user, recipe=recipe)
+            for recipe in rng.sample(
+                recipes, min(cart_per_user, len(recipes))
+            )
+        )
+    Follow.objects.bulk_create(follows)
+    FavoriteRecipe.objects.bulk_create(favorites)
+    ShoppingCart.objects.bulk_create(carts)
+    ShoppingCartTotals.objects.rebuild()
+    return users, tags, ingredients, recipes
+
+
+def get_scenarios(tags, ingredients, recipes):
+    return {
+        'recipes_list': ('/api/recipes/', {}),
+        'recipes_list_tags': (
+            '/api/recipes/', {'tags': [tag.slug for tag in tags[:2]]}
+        ),
+        'recipes_list_author': (
+            '/api/recipes/', {'author': recipes[0].author_id}
+        ),
+        'recipes_list_favorited': ('/api/recipes/', {'is_favorited': 1}),
+        'recipes_list_cart': ('/api/recipes/', {'is_in_shopping_cart': 1}),
+        'recipe_detail': (f'/api/recipes/{recipes[-1].id}/', {}),
+        'users_list': ('/api/users/', {}),
+        'subscriptions': (
+            '/api/users/subscriptions/', {'recipes_limit': 3}
+        ),
+        'download_shopping_cart': (
+            '/api/recipes/download_shopping_cart/', {}
+        ),
+        'ingredient_search': (
+            '/api/ingredients/', {'name': ingredients[0].name[:4]}
+        ),
+        'tags_list': ('/api/tags/', {}),
+    }
+
+
+def get_client(user):
+    token, _ = Token.objects.get_or_create(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+def request(client, path, params):
+    response = client.get(path, params)
+    if response.streaming:
+        b''.join(response.streaming_content)
+    if response.status_code != 200:
+        raise RuntimeError(
+            f'{path} ответил {response.status_code}: {response.content!r}'
+        )
+    return response
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    rank = max(0, -(-len(values) * percent // 100) - 1)
+    return values[int(rank)]
+
+
+def run_scenario(client, path, params, iterations, warmup):
+    for _ in range(warmup):
+        request(client, path, params)
+    durations = []
+    queries = []
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            request(client, path, params)
+            durations.append(time.perf_counter() - start)
+        queries.append(len(context.captured_queries))
+    tracemalloc.start()
+    try:
+        request(client, path, params)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'p50_ms': round(percentile(durations, 50) * 1000, 3),
+        'p95_ms': round(percentile(durations, 95) * 1000, 3),
+        'queries': max(queries),
+        'peak_memory_kb': round(peak_memory / 1024, 1),
+    }
+
+
+def run_benchmark(user, tags, ingredients, recipes, iterations=50,
+                  warmup=5, only=None):
+    client = get_client(user)
+    scenarios = get_scenarios(tags, ingredients, recipes)
+    return {
+        name: run_scenario(client, path, params, iterations, warmup)
+        for name, (path, params) in scenarios.items()
+        if not only or name in only
+    }
+
+
+def compare_results(baseline, results, threshold):
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if result['queries'] > previous['queries']:
+            regressions.append(
+                f'{name}: запросов {previous["queries"]} -> '
+                f'{result["queries"]}'
+            )
+        for metric in ('p50_ms', 'p95_ms', 'peak_memory_kb'):
+            limit = previous[metric] * (1 + threshold / 100)
+            if metric.endswith('_ms'):
+                limit = max(limit, previous[metric] + LATENCY_NOISE_MS)
+            if result[metric] > limit:
+                regressions.append(
+                    f'{name}: {metric} {previous[metric]} -> '
+                    f'{result[metric]}'
+                )
+    return regressions
@@ -0,0 +1,68 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+
+TAGS_LIST_CACHE_KEY = 'api:tags:list'
+INGREDIENTS_LIST_CACHE_KEY = 'api:ingredients:list:{version}'
+INGREDIENTS_VERSION_KEY = 'api:ingredients:version'
+
+
+def get_ingredients_version():
+    return cache.get(INGREDIENTS_VERSION_KEY, 0)
+
+
+def invalidate_ingredients():
+    cache.add(INGREDIENTS_VERSION_KEY, 0, None)
+    try:
+        cache.incr(INGREDIENTS_VERSION_KEY)
+    except ValueError:
+        cache.set(INGREDIENTS_VERSION_KEY, 1, None)
+
+
+def get_ingredients_list_cache_key():
+    return INGREDIENTS_LIST_CACHE_KEY.format(
+        version=get_ingredients_version()
+    )
+
+
+class CachedListMixin:
+    list_cache_key = None
+
+    def get_list_cache_key(self):
+        return self.list_cache_key
+
+    def get_list_cache(self, request, *args, **kwargs):
+        cache_key = self.get_list_cache_key()
+        cached = cache.get(cache_key)
+        if cached is None:
+            response = super().list(request, *args, **kwargs)
+            content = JSONRenderer().render(response.data)
+            cached = {
+                'content': content,
+                'etag': f'"{hashlib.md5(content).hexdigest()}"',
+                'last_modified': int(time.time()),
+            }
+            cache.set(cache_key, cached)
+        return cached
+
+    def list(self, request, *args, **kwargs):
+        if not isinstance(request.accepted_renderer, JSONRenderer):
+            return super().list(request, *args, **kwargs)
+        cached = self.get_list_cache(request, *args, **kwargs)
+        response = get_conditional_response(
+            request,
+            etag=cached['etag'],
+            last_modified=cached['last_modified'],
+        )
+        if response is None:
+            response = HttpResponse(
+                cached['content'], content_type='application/json'
+            )
+        response['ETag'] = cached['etag']
+        response['Last-Modified'] = http_date(cached['last_modified'])
+        return response
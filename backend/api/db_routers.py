@@ -0,0 +1,41 @@
+import itertools
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_state = threading.local()
+
+
+@contextmanager
+def use_primary(enabled=True):
+    previous = getattr(_state, 'use_primary', False)
+    _state.use_primary = enabled
+    try:
+        yield
+    finally:
+        _state.use_primary = previous
+
+
+class PrimaryReplicaRouter:
+    def __init__(self):
+        self.replicas = list(settings.DATABASE_REPLICAS)
+        self.replica_cycle = itertools.cycle(self.replicas)
+        self.lock = threading.Lock()
+
+    def db_for_read(self, model, **hints):
+        if (not self.replicas or getattr(_state, 'use_primary', False)
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        with self.lock:
+            return next(self.replica_cycle)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
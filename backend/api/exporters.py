@@ -0,0 +1,107 @@
+import csv
+import io
+
+from django.conf import settings
+from rest_framework import exceptions
+
+SHOPPING_LIST_TITLE = 'Список покупок с сайта Foodgram:'
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+class ShoppingListExporter:
+    content_type = None
+    extension = None
+
+    def __init__(self, ingredients):
+        self.ingredients = ingredients
+
+    @property
+    def filename(self):
+        return f'shopping-list.{self.extension}'
+
+    def render(self):
+        raise NotImplementedError
+
+
+class TextShoppingListExporter(ShoppingListExporter):
+    content_type = 'text/plain'
+    extension = 'txt'
+
+    def render(self):
+        yield f'{SHOPPING_LIST_TITLE}\n\n'
+        for name, measurement_unit, amount in self.ingredients:
+            yield f'{name} - {amount} {measurement_unit}\n'
+
+
+class CsvShoppingListExporter(ShoppingListExporter):
+    content_type = 'text/csv'
+    extension = 'csv'
+
+    def render(self):
+        writer = csv.writer(Echo())
+        yield writer.writerow(
+            ('Ингредиент', 'Количество', 'Единица измерения')
+        )
+        for name, measurement_unit, amount in self.ingredients:
+            yield writer.writerow((name, amount, measurement_unit))
+
+
+class PdfShoppingListExporter(ShoppingListExporter):
+    content_type = 'application/pdf'
+    extension = 'pdf'
+    font_name = 'ShoppingListFont'
+    font_size = 12
+    chunk_size = 64 * 1024
+
+    def render(self):
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.units import cm
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        from reportlab.pdfgen import canvas
+
+        pdfmetrics.registerFont(
+            TTFont(self.font_name, settings.SHOPPING_LIST_PDF_FONT)
+        )
+        buffer = io.BytesIO()
+        document = canvas.Canvas(buffer, pagesize=A4)
+        width, height = A4
+        line_height = self.font_size * 1.5
+        document.setFont(self.font_name, self.font_size)
+        document.drawString(2 * cm, height - 2 * cm, SHOPPING_LIST_TITLE)
+        y = height - 2 * cm - 2 * line_height
+        for name, measurement_unit, amount in self.ingredients:
+            if y < 2 * cm:
+                document.showPage()
+                document.setFont(self.font_name, self.font_size)
+                y = height - 2 * cm
+            document.drawString(
+                2 * cm, y, f'{name} - {amount} {measurement_unit}'
+            )
+            y -= line_height
+        document.save()
+        buffer.seek(0)
+        yield from iter(lambda: buffer.read(self.chunk_size), b'')
+
+
+SHOPPING_LIST_EXPORTERS = {
+    exporter.extension: exporter
+    for exporter in (
+        TextShoppingListExporter,
+        CsvShoppingListExporter,
+        PdfShoppingListExporter,
+    )
+}
+
+
+def get_shopping_list_exporter(file_type):
+    try:
+        return SHOPPING_LIST_EXPORTERS[file_type]
+    except KeyError:
+        raise exceptions.ValidationError(
+            f'Формат списка покупок {file_type} не поддерживается.'
+        )
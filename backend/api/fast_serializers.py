@@ -0,0 +1,90 @@
+from collections import defaultdict
+
+from recipes.models import RecipeIngredient, Tag
+
+from .middleware import measure_serialization
+from .relations import prefetch_user_relations
+from .serializers import get_recipe_image_url
+
+RECIPE_VALUES = (
+    'id', 'name', 'image', 'image_processed', 'text', 'cooking_time',
+    'pub_date',
+    'author__email', 'author__id', 'author__username',
+    'author__first_name', 'author__last_name',
+)
+
+
+class RecipeValuesSerializer:
+    def __init__(self, instance, many=False, context=None):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+
+    def get_tags(self, recipe_ids):
+        tags = defaultdict(list)
+        for tag in Tag.objects.filter(recipe__in=recipe_ids).values(
+            'id', 'name', 'color', 'slug', 'recipe'
+        ):
+            tags[tag.pop('recipe')].append(tag)
+        return tags
+
+    def get_ingredients(self, recipe_ids):
+        ingredients = defaultdict(list)
+        for recipe_id, ingredient_id, name, unit, amount in (
+            RecipeIngredient.objects.filter(
+                recipe__in=recipe_ids
+            ).values_list(
+                'recipe_id', 'ingredient__id', 'ingredient__name',
+                'ingredient__measurement_unit', 'amount'
+            )
+        ):
+            ingredients[recipe_id].append({
+                'id': ingredient_id,
+                'name': name,
+                'measurement_unit': unit,
+                'amount': amount,
+            })
+        return ingredients
+
+    def to_representation(self, rows):
+        recipe_ids = [row['id'] for row in rows]
+        if not recipe_ids:
+            return []
+        tags = self.get_tags(recipe_ids)
+        ingredients = self.get_ingredients(recipe_ids)
+        relations = prefetch_user_relations(
+            self.context.get('request'),
+            recipe_ids,
+            [row['author__id'] for row in rows]
+        )
+        return [
+            {
+                'id': row['id'],
+                'tags': tags[row['id']],
+                'author': {
+                    'email': row['author__email'],
+                    'id': row['author__id'],
+                    'username': row['author__username'],
+                    'first_name': row['author__first_name'],
+                    'last_name': row['author__last_name'],
+                    'is_subscribed': row['author__id'] in relations.following,
+                },
+                'ingredients': ingredients[row['id']],
+                'is_favorited': row['id'] in relations.favorites,
+                'is_in_shopping_cart': row['id'] in relations.shopping_cart,
+                'name': row['name'],
+                'image': get_recipe_image_url(
+                    row['image'], row['image_processed'], self.context
+                ),
+                'text': row['text'],
+                'cooking_time': row['cooking_time'],
+            }
+            for row in rows
+        ]
+
+    @property
+    def data(self):
+        with measure_serialization(self.context.get('request')):
+            if self.many:
+                return self.to_representation(list(self.instance))
+            return self.to_representation([self.instance])[0]
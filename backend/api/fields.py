@@ -0,0 +1,26 @@
+import os
+
+from django.core.files.base import ContentFile
+from drf_base64.fields import Base64FileField
+
+from .images import IMAGE_EXTENSIONS, get_image_format
+
+
+class RecipeImageField(Base64FileField):
+    default_error_messages = {
+        'invalid_image': 'Загрузите корректное изображение.',
+    }
+
+    def to_internal_value(self, data):
+        file = super().to_internal_value(data)
+        try:
+            image_format = get_image_format(file)
+        except Exception:
+            self.fail('invalid_image')
+        if image_format not in IMAGE_EXTENSIONS:
+            self.fail('invalid_image')
+        file.seek(0)
+        stem = os.path.splitext(os.path.basename(file.name))[0]
+        return ContentFile(
+            file.read(), name=f'{stem}.{IMAGE_EXTENSIONS[image_format]}'
+        )
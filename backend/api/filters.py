@@ -1,35 +1,75 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
 from rest_framework.filters import SearchFilter
 
-from recipes.models import Recipe
+from recipes.models import FavoriteRecipe, Recipe, RecipeTag, ShoppingCart, Tag
+
+from .search import search_recipes
 
 
 class RecipeFilter(FilterSet):
-    author = filters.AllValuesFilter(field_name='author')
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    author = filters.NumberFilter(field_name='author')
+    tags = filters.ModelMultipleChoiceFilter(
+        field_name='tags__slug',
+        to_field_name='slug',
+        queryset=Tag.objects.all(),
+        method='get_tags',
+    )
+    search = filters.CharFilter(method='get_search')
     is_favorited = filters.BooleanFilter(method='get_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'По популярности'),),
+        method='get_ordering',
+    )
 
     class Meta:
         model = Recipe
         fields = (
             'author',
             'tags',
+            'search',
             'is_favorited',
             'is_in_shopping_cart',
+            'ordering',
         )
 
+    def get_tags(self, queryset, name, data):
+        if not data:
+            return queryset
+        return queryset.annotate(
+            has_tags=Exists(RecipeTag.objects.filter(
+                recipe=OuterRef('pk'), tag__in=[tag.id for tag in data]
+            ))
+        ).filter(has_tags=True)
+
+    def get_search(self, queryset, name, data):
+        return search_recipes(queryset, data)
+
     def get_is_favorited(self, queryset, name, data):
         if data and not self.request.user.is_anonymous:
-            return queryset.filter(favorite_recipe__user=self.request.user)
+            return queryset.annotate(
+                in_favorites=Exists(FavoriteRecipe.objects.filter(
+                    recipe=OuterRef('pk'), user=self.request.user
+                ))
+            ).filter(in_favorites=True)
         return queryset
 
     def get_is_in_shopping_cart(self, queryset, name, data):
         if data and not self.request.user.is_anonymous:
-            return queryset.filter(
-                shopping_cart_recipe__user=self.request.user
+            return queryset.annotate(
+                in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    recipe=OuterRef('pk'), user=self.request.user
+                ))
+            ).filter(in_shopping_cart=True)
+        return queryset
+
+    def get_ordering(self, queryset, name, data):
+        if data == 'popular':
+            return queryset.order_by(
+                '-favorites_count', '-cart_count', '-pub_date', '-id'
             )
         return queryset
 
@@ -0,0 +1,263 @@
+import hashlib
+import io
+import logging
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import connection
+from PIL import Image, ImageOps
+
+from recipes.models import Recipe
+from recipes.storage import get_content_addressed_name, write_file_atomically
+
+logger = logging.getLogger(__name__)
+
+STAGING_DIR = 'staging'
+THUMBNAILS_DIR = 'recipes/thumbnails'
+THUMBNAIL_FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+IMAGE_EXTENSIONS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'GIF': 'gif',
+    'WEBP': 'webp',
+}
+ORIENTATION_TAG = 0x0112
+JPEG_KEPT_APP_MARKERS = {0xE0, 0xE2, 0xEE}
+PNG_METADATA_CHUNKS = {b'tEXt', b'zTXt', b'iTXt', b'eXIf', b'tIME'}
+GIF_KEPT_APPLICATIONS = {b'NETSCAPE2.0', b'ANIMEXTS1.0'}
+WEBP_METADATA_CHUNKS = {b'EXIF', b'XMP '}
+WEBP_METADATA_FLAGS = 0x0C
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.RECIPE_IMAGE_WORKERS
+        )
+    return _executor
+
+
+def get_thumbnail_name(name, size, extension):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return f'{THUMBNAILS_DIR}/{stem}_{size}.{extension}'
+
+
+def get_image_format(content):
+    with Image.open(content) as image:
+        return image.format
+
+
+def is_staged_name(name):
+    return name.startswith(f'{STAGING_DIR}/')
+
+
+def stage_image(staging_root, content):
+    extension = os.path.splitext(content.name)[1].lower()
+    name = f'{STAGING_DIR}/{uuid.uuid4().hex}{extension}'
+    os.makedirs(os.path.join(staging_root, STAGING_DIR), exist_ok=True)
+    content.seek(0)
+    write_file_atomically(os.path.join(staging_root, name), content.read())
+    return name
+
+
+def strip_jpeg_metadata(data):
+    segments = [data[:2]]
+    position = 2
+    while position < len(data):
+        marker = data[position + 1]
+        if marker == 0xFF:
+            position += 1
+            continue
+        if marker == 0xDA:
+            segments.append(data[position:])
+            break
+        if 0xD0 <= marker <= 0xD9 or marker == 0x01:
+            segments.append(data[position:position + 2])
+            position += 2
+            continue
+        end = position + 2 + int.from_bytes(
+            data[position + 2:position + 4], 'big'
+        )
+        if not (0xE0 <= marker <= 0xEF or marker == 0xFE) or (
+            marker in JPEG_KEPT_APP_MARKERS
+        ):
+            segments.append(data[position:end])
+        position = end
+    return b''.join(segments)
+
+
+def strip_png_metadata(data):
+    chunks = [data[:8]]
+    position = 8
+    while position < len(data):
+        end = position + 12 + int.from_bytes(
+            data[position:position + 4], 'big'
+        )
+        if data[position + 4:position + 8] not in PNG_METADATA_CHUNKS:
+            chunks.append(data[position:end])
+        position = end
+    return b''.join(chunks)
+
+
+def skip_gif_sub_blocks(data, position):
+    while data[position]:
+        position += data[position] + 1
+    return position + 1
+
+
+def strip_gif_metadata(data):
+    position = 13
+    if data[10] & 0x80:
+        position += 3 << ((data[10] & 0x07) + 1)
+    blocks = [data[:position]]
+    while position < len(data) and data[position] != 0x3B:
+        start = position
+        if data[position] == 0x2C:
+            position += 10
+            if data[position - 1] & 0x80:
+                position += 3 << ((data[position - 1] & 0x07) + 1)
+            position = skip_gif_sub_blocks(data, position + 1)
+            blocks.append(data[start:position])
+            continue
+        label = data[position + 1]
+        position = skip_gif_sub_blocks(data, position + 2)
+        if label == 0xFE or (label == 0xFF and data[
+            start + 3:start + 14
+        ] not in GIF_KEPT_APPLICATIONS):
+            continue
+        blocks.append(data[start:position])
+    blocks.append(b'\x3b')
+    return b''.join(blocks)
+
+
+def strip_webp_metadata(data):
+    chunks = []
+    position = 12
+    while position < len(data):
+        fourcc = data[position:position + 4]
+        size = int.from_bytes(data[position + 4:position + 8], 'little')
+        end = position + 8 + size + size % 2
+        chunk = data[position:end]
+        if fourcc == b'VP8X':
+            chunk = (
+                chunk[:8] + bytes((chunk[8] & ~WEBP_METADATA_FLAGS,))
+                + chunk[9:]
+            )
+        if fourcc not in WEBP_METADATA_CHUNKS:
+            chunks.append(chunk)
+        position = end
+    body = b'WEBP' + b''.join(chunks)
+    return b'RIFF' + len(body).to_bytes(4, 'little') + body
+
+
+METADATA_STRIPPERS = {
+    'JPEG': strip_jpeg_metadata,
+    'PNG': strip_png_metadata,
+    'GIF': strip_gif_metadata,
+    'WEBP': strip_webp_metadata,
+}
+
+
+def strip_image_metadata(data, image):
+    if image.getexif().get(ORIENTATION_TAG, 1) == 1:
+        return METADATA_STRIPPERS[image.format](data)
+    buffer = io.BytesIO()
+    ImageOps.exif_transpose(image).save(
+        buffer, format=image.format, quality=95
+    )
+    return buffer.getvalue()
+
+
+def publish_image(media_root, name, data):
+    digest = hashlib.sha256(data).hexdigest()
+    upload_to = Recipe._meta.get_field('image').upload_to
+    published_name = get_content_addressed_name(
+        os.path.join(upload_to, os.path.basename(name)), digest
+    )
+    path = os.path.join(media_root, published_name)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_file_atomically(path, data)
+    return published_name
+
+
+def process_image(media_root, staging_root, name, sizes):
+    root = staging_root if is_staged_name(name) else media_root
+    with open(os.path.join(root, name), 'rb') as file:
+        data = file.read()
+    with Image.open(io.BytesIO(data)) as original:
+        if original.format not in METADATA_STRIPPERS:
+            raise ValueError(f'Неподдерживаемый формат {original.format}.')
+        data = strip_image_metadata(data, original)
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+    name = publish_image(media_root, name, data)
+
+    os.makedirs(os.path.join(media_root, THUMBNAILS_DIR), exist_ok=True)
+    for size_name, size in sizes.items():
+        thumbnail = image.copy()
+        thumbnail.thumbnail((size, size), Image.LANCZOS)
+        for extension, thumbnail_format in THUMBNAIL_FORMATS.items():
+            if thumbnail_format == 'JPEG' and thumbnail.mode != 'RGB':
+                result = thumbnail.convert('RGB')
+            else:
+                result = thumbnail
+            buffer = io.BytesIO()
+            result.save(buffer, format=thumbnail_format, quality=85)
+            write_file_atomically(
+                os.path.join(
+                    media_root, get_thumbnail_name(name, size_name, extension)
+                ),
+                buffer.getvalue()
+            )
+    return name
+
+
+def mark_image_processed(name, processed_name):
+    Recipe.objects.filter(image=name).update(
+        image=processed_name, image_processed=True
+    )
+    if is_staged_name(name):
+        try:
+            os.remove(os.path.join(settings.RECIPE_IMAGE_STAGING_ROOT, name))
+        except FileNotFoundError:
+            pass
+
+
+def finish_image_processing(name, future):
+    try:
+        mark_image_processed(name, future.result())
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s', name)
+    finally:
+        connection.close()
+
+
+def schedule_image_processing(name):
+    args = (
+        settings.MEDIA_ROOT, settings.RECIPE_IMAGE_STAGING_ROOT, name,
+        settings.RECIPE_IMAGE_THUMBNAILS
+    )
+    if not settings.RECIPE_IMAGE_WORKERS:
+        mark_image_processed(name, process_image(*args))
+        return
+    future = get_executor().submit(process_image, *args)
+    future.add_done_callback(partial(finish_image_processing, name))
+
+
+def get_image_url(name, request=None):
+    if is_staged_name(name):
+        return None
+    url = Recipe._meta.get_field('image').storage.url(name)
+    if request is None:
+        return url
+    return request.build_absolute_uri(url)
@@ -0,0 +1,107 @@
+import json
+import platform
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (setup_databases, setup_test_environment,
+                               teardown_databases, teardown_test_environment)
+
+from api.benchmark import compare_results, generate_data, run_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет тестовую базу синтетическими данными и замеряет '
+        'основные эндпоинты API.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--ingredients', type=int, default=200)
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--only', nargs='+', help='Запустить только эти сценарии.'
+        )
+        parser.add_argument(
+            '--output', help='Сохранить результаты в JSON-файл.'
+        )
+        parser.add_argument(
+            '--baseline', help='Сравнить результаты с сохранённым JSON.'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=20,
+            help='Допустимый рост времени и памяти в процентах.',
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            users, tags, ingredients, recipes = generate_data(
+                options['users'],
+                options['recipes'],
+                ingredients_count=options['ingredients'],
+                seed=options['seed'],
+            )
+            results = run_benchmark(
+                users[0], tags, ingredients, recipes,
+                iterations=options['iterations'],
+                warmup=options['warmup'],
+                only=options['only'],
+            )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        self.print_results(results)
+        if options['output']:
+            self.save_results(options, results)
+        if options['baseline']:
+            self.check_baseline(options, results)
+
+    def print_results(self, results):
+        self.stdout.write(
+            f'{"сценарий":<28}{"p50, мс":>10}{"p95, мс":>10}'
+            f'{"запросов":>10}{"память, КБ":>12}'
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<28}{result["p50_ms"]:>10}{result["p95_ms"]:>10}'
+                f'{result["queries"]:>10}{result["peak_memory_kb"]:>12}'
+            )
+
+    def save_results(self, options, results):
+        data = {
+            'meta': {
+                'users': options['users'],
+                'recipes': options['recipes'],
+                'ingredients': options['ingredients'],
+                'iterations': options['iterations'],
+                'seed': options['seed'],
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(data, file, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результаты сохранены в {options["output"]}.')
+
+    def check_baseline(self, options, results):
+        with open(options['baseline'], encoding='utf-8') as file:
+            baseline = json.load(file)['results']
+        regressions = compare_results(
+            baseline, results, options['threshold']
+        )
+        if regressions:
+            raise CommandError(
+                'Найдены регрессии:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий не найдено.'))
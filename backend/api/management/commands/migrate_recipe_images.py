@@ -0,0 +1,98 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.images import (THUMBNAILS_DIR, is_staged_name, mark_image_processed,
+                        process_image)
+from recipes.models import Recipe
+from recipes.storage import is_content_addressed_name
+
+
+class Command(BaseCommand):
+    help = (
+        'Переименовывает изображения рецептов по хешу содержимого '
+        'и удаляет файлы, на которые не ссылается ни один рецепт.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет сделано.',
+        )
+        parser.add_argument(
+            '--no-gc',
+            action='store_true',
+            help='Не удалять файлы без ссылок.',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=3600,
+            help='Не удалять файлы моложе указанного числа секунд.',
+        )
+
+    def handle(self, *args, **options):
+        self.storage = Recipe._meta.get_field('image').storage
+        self.dry_run = options['dry_run']
+        migrated = self.migrate_files()
+        removed = 0
+        if not options['no_gc']:
+            removed = self.collect_garbage(options['min_age'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Переименовано изображений: {migrated}, '
+            f'удалено файлов: {removed}.'
+        ))
+
+    def migrate_files(self):
+        names = Recipe.objects.values_list('image', flat=True).distinct()
+        migrated = 0
+        for name in list(names):
+            if is_content_addressed_name(name) or is_staged_name(name):
+                continue
+            if not self.storage.exists(name):
+                self.stderr.write(f'{name}: файл не найден.')
+                continue
+            self.stdout.write(f'{name}: переименование.')
+            migrated += 1
+            if self.dry_run:
+                continue
+            mark_image_processed(name, process_image(
+                settings.MEDIA_ROOT, settings.RECIPE_IMAGE_STAGING_ROOT,
+                name, settings.RECIPE_IMAGE_THUMBNAILS
+            ))
+        return migrated
+
+    def collect_garbage(self, min_age):
+        referenced = set(
+            Recipe.objects.values_list('image', flat=True).distinct()
+        )
+        referenced_stems = {
+            os.path.splitext(os.path.basename(name))[0]
+            for name in referenced
+        }
+        upload_dir = Recipe._meta.get_field('image').upload_to.rstrip('/')
+        directories = (
+            (upload_dir, lambda name: name in referenced),
+            (THUMBNAILS_DIR, lambda name: os.path.basename(name).rsplit(
+                '_', 1
+            )[0] in referenced_stems),
+        )
+        deadline = time.time() - min_age
+        removed = 0
+        for directory, is_referenced in directories:
+            if not self.storage.exists(directory):
+                continue
+            for file_name in self.storage.listdir(directory)[1]:
+                name = f'{directory}/{file_name}'
+                if is_referenced(name):
+                    continue
+                if os.path.getmtime(self.storage.path(name)) > deadline:
+                    continue
+                self.stdout.write(f'{name}: удаление.')
+                removed += 1
+                if not self.dry_run:
+                    self.storage.delete(name)
+        return removed
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.images import mark_image_processed, process_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создаёт миниатюры для изображений рецептов без миниатюр.'
+
+    def handle(self, *args, **options):
+        names = Recipe.objects.filter(
+            image_processed=False
+        ).values_list('image', flat=True).distinct()
+        processed = 0
+        for name in list(names):
+            try:
+                processed_name = process_image(
+                    settings.MEDIA_ROOT, settings.RECIPE_IMAGE_STAGING_ROOT,
+                    name, settings.RECIPE_IMAGE_THUMBNAILS
+                )
+            except (OSError, ValueError) as error:
+                self.stderr.write(f'{name}: {error}')
+                continue
+            mark_image_processed(name, processed_name)
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {processed}.'
+        ))
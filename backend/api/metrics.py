@@ -0,0 +1,149 @@
+import threading
+from bisect import bisect_left
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (
+    256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304,
+)
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, labels, value):
+        labels = tuple(sorted(labels.items()))
+        with self._lock:
+            counts, total = self._series.get(
+                labels, ([0] * (len(self.buckets) + 1), 0)
+            )
+            counts[bisect_left(self.buckets, value)] += 1
+            self._series[labels] = (counts, total + value)
+
+    def collect(self):
+        with self._lock:
+            series = {
+                labels: (list(counts), total)
+                for labels, (counts, total) in self._series.items()
+            }
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} histogram',
+        ]
+        for labels, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                bucket_labels = format_labels(labels + (('le', bound),))
+                lines.append(
+                    f'{self.name}_bucket{bucket_labels} {cumulative}'
+                )
+            lines.append(f'{self.name}_sum{format_labels(labels)} {total}')
+            lines.append(
+                f'{self.name}_count{format_labels(labels)} {cumulative}'
+            )
+        return lines
+
+
+class Counter:
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def inc(self, labels, value=1):
+        labels = tuple(sorted(labels.items()))
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + value
+
+    def collect(self):
+        with self._lock:
+            series = dict(self._series)
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} counter',
+        ]
+        for labels, value in sorted(series.items()):
+            lines.append(f'{self.name}{format_labels(labels)} {value}')
+        return lines
+
+
+def format_labels(labels):
+    escaped = (
+        (key, str(value).replace('\\', r'\\').replace('"', r'\"'))
+        for key, value in labels
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+REQUEST_DURATION = Histogram(
+    'foodgram_request_duration_seconds',
+    'Время обработки запроса.',
+    DURATION_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    'foodgram_request_queries',
+    'Количество SQL-запросов на запрос.',
+    QUERY_BUCKETS,
+)
+REQUEST_DB_DURATION = Histogram(
+    'foodgram_request_db_duration_seconds',
+    'Суммарное время SQL-запросов на запрос.',
+    DURATION_BUCKETS,
+)
+RESPONSE_SERIALIZE_DURATION = Histogram(
+    'foodgram_response_serialize_duration_seconds',
+    'Время работы сериализаторов над данными ответа.',
+    DURATION_BUCKETS,
+)
+RESPONSE_RENDER_DURATION = Histogram(
+    'foodgram_response_render_duration_seconds',
+    'Время рендеринга данных ответа в JSON.',
+    DURATION_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    'foodgram_response_size_bytes',
+    'Размер тела ответа.',
+    SIZE_BUCKETS,
+)
+
+DB_POOL_WAIT = Histogram(
+    'foodgram_db_pool_wait_seconds',
+    'Время ожидания соединения из пула.',
+    DURATION_BUCKETS,
+)
+DB_POOL_TIMEOUTS = Counter(
+    'foodgram_db_pool_timeouts_total',
+    'Количество отказов из-за исчерпания пула соединений.',
+)
+DB_RECONNECTS = Counter(
+    'foodgram_db_reconnects_total',
+    'Количество соединений с базой, закрытых проверкой работоспособности.',
+)
+
+METRICS = [
+    REQUEST_DURATION,
+    REQUEST_QUERIES,
+    REQUEST_DB_DURATION,
+    RESPONSE_SERIALIZE_DURATION,
+    RESPONSE_RENDER_DURATION,
+    RESPONSE_SIZE,
+    DB_POOL_WAIT,
+    DB_POOL_TIMEOUTS,
+    DB_RECONNECTS,
+]
+
+
+def render_metrics(metrics=None):
+    lines = []
+    for metric in metrics or METRICS:
+        lines.extend(metric.collect())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,173 @@
+import hashlib
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from rest_framework.permissions import SAFE_METHODS
+
+from .db_routers import use_primary
+
+from .metrics import (REQUEST_DB_DURATION, REQUEST_DURATION, REQUEST_QUERIES,
+                      RESPONSE_RENDER_DURATION, RESPONSE_SERIALIZE_DURATION,
+                      RESPONSE_SIZE)
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+@contextmanager
+def measure_serialization(request):
+    request = getattr(request, '_request', request)
+    if request is None or getattr(
+        request, 'instrumentation_serializing', False
+    ):
+        yield
+    else:
+        request.instrumentation_serializing = True
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            request.instrumentation_serializing = False
+            request.instrumentation_serialize = getattr(
+                request, 'instrumentation_serialize', 0
+            ) + time.perf_counter() - start
+
+
+def get_view_name(request, view_func):
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return request.resolver_match.view_name
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+class InstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with self.count_queries(counter):
+            response = self.get_response(request)
+        if response.streaming:
+            response.streaming_content = self.measure_streaming_content(
+                response.streaming_content, request, counter, start
+            )
+        else:
+            self.record(
+                request, counter, time.perf_counter() - start,
+                len(response.content)
+            )
+        return response
+
+    def count_queries(self, counter):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+        return stack
+
+    def record(self, request, counter, duration, size):
+        labels = {
+            'view': getattr(request, 'instrumentation_view', 'unresolved'),
+            'method': request.method,
+        }
+        REQUEST_DURATION.observe(labels, duration)
+        REQUEST_QUERIES.observe(labels, counter.count)
+        REQUEST_DB_DURATION.observe(labels, counter.duration)
+        serialize_duration = getattr(
+            request, 'instrumentation_serialize', None
+        )
+        if serialize_duration is not None:
+            RESPONSE_SERIALIZE_DURATION.observe(labels, serialize_duration)
+        render_duration = getattr(request, 'instrumentation_render', None)
+        if render_duration is not None:
+            RESPONSE_RENDER_DURATION.observe(labels, render_duration)
+        RESPONSE_SIZE.observe(labels, size)
+
+        if 0 < settings.QUERY_BUDGET < counter.count:
+            logger.warning(
+                'Запрос %s %s (%s) выполнил %d SQL-запросов за %.3f с, '
+                'бюджет %d.',
+                request.method, request.path, labels['view'],
+                counter.count, counter.duration, settings.QUERY_BUDGET,
+            )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.instrumentation_view = get_view_name(request, view_func)
+
+    def process_template_response(self, request, response):
+        start = time.perf_counter()
+
+        def finish_render(response):
+            request.instrumentation_render = time.perf_counter() - start
+
+        response.add_post_render_callback(finish_render)
+        return response
+
+    def measure_streaming_content(self, content, request, counter, start):
+        size = 0
+        try:
+            with self.count_queries(counter):
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            self.record(request, counter, time.perf_counter() - start, size)
+
+
+def get_primary_sticky_keys(request):
+    identities = (
+        request.META.get('HTTP_AUTHORIZATION'),
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME),
+    )
+    return [
+        'db-primary-sticky:' + hashlib.sha256(identity.encode()).hexdigest()
+        for identity in identities if identity
+    ]
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        sticky_keys = get_primary_sticky_keys(request)
+        is_write = request.method not in SAFE_METHODS
+        primary = is_write or bool(cache.get_many(sticky_keys))
+        with use_primary(primary):
+            response = self.get_response(request)
+        if response.streaming:
+            response.streaming_content = self.route_streaming_content(
+                response.streaming_content, primary
+            )
+        if is_write and sticky_keys:
+            cache.set_many(
+                dict.fromkeys(sticky_keys, True),
+                settings.DATABASE_REPLICA_STICKY_SECONDS
+            )
+        return response
+
+    def route_streaming_content(self, content, primary):
+        with use_primary(primary):
+            yield from content
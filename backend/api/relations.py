@@ -0,0 +1,127 @@
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+
+from recipes.models import FavoriteRecipe, ShoppingCart
+from users.models import Follow
+
+RELATIONS_CACHE_KEY = 'api:relations:{user_id}:{version}'
+RELATIONS_VERSION_KEY = 'api:relations:{user_id}:version'
+
+
+class UserRelations:
+    def __init__(self, favorites=(), shopping_cart=(), following=()):
+        self.favorites = frozenset(favorites)
+        self.shopping_cart = frozenset(shopping_cart)
+        self.following = frozenset(following)
+
+    @classmethod
+    def load(cls, user, recipe_ids=None, author_ids=None):
+        favorites, shopping_cart, following = get_related_ids(user)
+        if recipe_ids is not None:
+            favorites = favorites.filter(recipe_id__in=recipe_ids)
+            shopping_cart = shopping_cart.filter(recipe_id__in=recipe_ids)
+        if author_ids is not None:
+            following = following.filter(author_id__in=author_ids)
+        return cls(favorites, shopping_cart, following)
+
+    def dump(self):
+        return tuple(
+            array('L', sorted(ids)).tobytes()
+            for ids in (self.favorites, self.shopping_cart, self.following)
+        )
+
+    @classmethod
+    def restore(cls, data):
+        ids = []
+        for chunk in data:
+            values = array('L')
+            values.frombytes(chunk)
+            ids.append(values)
+        return cls(*ids)
+
+
+class RelatedIds:
+    def __init__(self, queryset, field):
+        self.queryset = queryset
+        self.field = field
+        self.known = {}
+
+    def __contains__(self, value):
+        if value not in self.known:
+            self.known[value] = self.queryset.filter(
+                **{self.field: value}
+            ).exists()
+        return self.known[value]
+
+
+class UserRelationsLookup:
+    def __init__(self, user):
+        favorites, shopping_cart, following = get_related_ids(user)
+        self.favorites = RelatedIds(favorites, 'recipe_id')
+        self.shopping_cart = RelatedIds(shopping_cart, 'recipe_id')
+        self.following = RelatedIds(following, 'author_id')
+
+
+def get_related_ids(user):
+    return (
+        FavoriteRecipe.objects.filter(
+            user=user
+        ).values_list('recipe_id', flat=True),
+        ShoppingCart.objects.filter(
+            user=user
+        ).values_list('recipe_id', flat=True),
+        Follow.objects.filter(
+            user=user
+        ).values_list('author_id', flat=True),
+    )
+
+
+def get_relations_version(user):
+    return cache.get(RELATIONS_VERSION_KEY.format(user_id=user.id), 0)
+
+
+def get_cached_user_relations(user):
+    key = RELATIONS_CACHE_KEY.format(
+        user_id=user.id, version=get_relations_version(user)
+    )
+    data = cache.get(key)
+    if data is not None:
+        return UserRelations.restore(data)
+    relations = UserRelations.load(user)
+    cache.set(key, relations.dump(), settings.USER_RELATIONS_CACHE_TIMEOUT)
+    return relations
+
+
+def get_user_relations(request):
+    if request is None or request.user.is_anonymous:
+        return UserRelations()
+    if not hasattr(request, 'user_relations'):
+        if settings.USER_RELATIONS_CACHE_TIMEOUT:
+            request.user_relations = get_cached_user_relations(request.user)
+        else:
+            request.user_relations = UserRelationsLookup(request.user)
+    return request.user_relations
+
+
+def prefetch_user_relations(request, recipe_ids=(), author_ids=()):
+    if (request is None or request.user.is_anonymous
+            or settings.USER_RELATIONS_CACHE_TIMEOUT):
+        return get_user_relations(request)
+    request.user_relations = UserRelations.load(
+        request.user, recipe_ids, author_ids
+    )
+    return request.user_relations
+
+
+def invalidate_user_relations(request):
+    if hasattr(request, 'user_relations'):
+        del request.user_relations
+    if settings.USER_RELATIONS_CACHE_TIMEOUT:
+        key = RELATIONS_VERSION_KEY.format(user_id=request.user.id)
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
@@ -0,0 +1,190 @@
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import Case, F, IntegerField, When
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from .caching import get_ingredients_version
+from .serializers import IngredientSerializer
+
+SEARCH_CONFIG = 'russian'
+NAME_WEIGHT = 1.0
+TEXT_WEIGHT = 0.4
+LAST_CHARACTER = chr(0x10FFFF)
+
+
+def tokenize(text):
+    return re.findall(r'\w+', (text or '').lower())
+
+
+class ProcessLocalIndex:
+    timeout_setting = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._snapshot = None
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._snapshot = None
+
+    def build(self):
+        raise NotImplementedError
+
+    def get_version(self):
+        return None
+
+    def load(self, version):
+        with self._lock:
+            generation = self._generation
+        snapshot = (time.monotonic(), version, self.build())
+        with self._lock:
+            if generation == self._generation:
+                self._snapshot = snapshot
+        return snapshot
+
+    def get_data(self):
+        version = self.get_version()
+        snapshot = self._snapshot
+        if (snapshot is None or snapshot[1] != version
+                or time.monotonic() - snapshot[0]
+                > getattr(settings, self.timeout_setting)):
+            snapshot = self.load(version)
+        return snapshot[2]
+
+
+class IngredientIndex(ProcessLocalIndex):
+    timeout_setting = 'INGREDIENT_INDEX_TIMEOUT'
+
+    def get_version(self):
+        return get_ingredients_version()
+
+    def build(self):
+        items = sorted(
+            (
+                (item['name'].lower(), dict(item))
+                for item in IngredientSerializer(
+                    Ingredient.objects.all(), many=True
+                ).data
+            ),
+            key=lambda entry: (entry[0], entry[1]['id'])
+        )
+        return [name for name, _ in items], [item for _, item in items]
+
+    def search(self, query):
+        names, items = self.get_data()
+        query = query.strip().lower()
+        start = bisect_left(names, query)
+        end = bisect_left(names, query + LAST_CHARACTER, start)
+        prefix_matches = items[start:end]
+        substring_matches = [
+            item for position, (name, item) in enumerate(zip(names, items))
+            if query in name and not start <= position < end
+        ]
+        return prefix_matches + substring_matches
+
+
+class RecipeSearchIndex(ProcessLocalIndex):
+    timeout_setting = 'RECIPE_SEARCH_INDEX_TIMEOUT'
+
+    def build(self):
+        postings = defaultdict(dict)
+        for recipe_id, name, text in Recipe.objects.values_list(
+            'id', 'name', 'text'
+        ).iterator():
+            for weight, field in ((TEXT_WEIGHT, text), (NAME_WEIGHT, name)):
+                for token in tokenize(field):
+                    postings[token][recipe_id] = weight
+        tokens = sorted(postings)
+        return tokens, [postings[token] for token in tokens]
+
+    def match(self, tokens, postings, query_token):
+        start = bisect_left(tokens, query_token)
+        end = bisect_left(tokens, query_token + LAST_CHARACTER, start)
+        scores = {}
+        for recipes in postings[start:end]:
+            for recipe_id, weight in recipes.items():
+                scores[recipe_id] = max(scores.get(recipe_id, 0), weight)
+        return scores
+
+    def search(self, query):
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return []
+        tokens, postings = self.get_data()
+        scores = None
+        for query_token in query_tokens:
+            matches = self.match(tokens, postings, query_token)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {
+                    recipe_id: score + matches[recipe_id]
+                    for recipe_id, score in scores.items()
+                    if recipe_id in matches
+                }
+        return sorted(scores, key=lambda recipe_id: (
+            -scores[recipe_id], -recipe_id
+        ))
+
+
+class RecipeIngredientIndex(ProcessLocalIndex):
+    timeout_setting = 'RECIPE_INGREDIENT_INDEX_TIMEOUT'
+
+    def build(self):
+        postings = defaultdict(list)
+        sizes = Counter()
+        for ingredient_id, recipe_id in RecipeIngredient.objects.order_by(
+            'recipe_id'
+        ).values_list('ingredient_id', 'recipe_id').iterator():
+            postings[ingredient_id].append(recipe_id)
+            sizes[recipe_id] += 1
+        return {
+            ingredient_id: array('q', recipe_ids)
+            for ingredient_id, recipe_ids in postings.items()
+        }, sizes
+
+    def search(self, ingredient_ids, max_missing=None):
+        postings, sizes = self.get_data()
+        matched = Counter()
+        for ingredient_id in set(ingredient_ids):
+            matched.update(postings.get(ingredient_id, ()))
+        results = []
+        for recipe_id, count in matched.items():
+            missing = sizes[recipe_id] - count
+            if max_missing is None or missing <= max_missing:
+                results.append(
+                    (-count / sizes[recipe_id], missing, -recipe_id)
+                )
+        results.sort()
+        return [-recipe_id for _, _, recipe_id in results]
+
+
+def search_recipes(queryset, query):
+    if connections[queryset.db].vendor == 'postgresql':
+        search_query = SearchQuery(query, config=SEARCH_CONFIG)
+        return queryset.annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        ).filter(search_vector=search_query).order_by('-rank', '-pub_date')
+    recipe_ids = recipe_search_index.search(query)
+    return queryset.filter(id__in=recipe_ids).order_by(Case(
+        *(
+            When(id=recipe_id, then=position)
+            for position, recipe_id in enumerate(recipe_ids)
+        ),
+        output_field=IntegerField(),
+    ))
+
+
+ingredient_index = IngredientIndex()
+recipe_search_index = RecipeSearchIndex()
+recipe_ingredient_index = RecipeIngredientIndex()
@@ -1,24 +1,58 @@
+from functools import partial
+
+from django.conf import settings
 from django.core.validators import MinValueValidator
-from drf_base64.fields import Base64ImageField
+from django.db import transaction
 from rest_framework import exceptions, serializers
 
-from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
-from users.models import Follow, User
+from recipes.models import (Ingredient, Recipe, RecipeIngredient, RecipeTag,
+                            ShoppingCartTotals, Tag)
+from users.models import User
+
+from .fields import RecipeImageField
+from .images import (get_image_url, get_thumbnail_name,
+                     schedule_image_processing, stage_image)
+from .middleware import measure_serialization
+from .relations import get_user_relations
+
+
+class TimedSerializerMixin:
+    @property
+    def data(self):
+        with measure_serialization(self.context.get('request')):
+            return super().data
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    pass
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = ('id', 'name', 'color', 'slug')
+        list_serializer_class = TimedListSerializer
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ('id', 'name', 'measurement_unit')
+        list_serializer_class = TimedListSerializer
 
 
-class UserSerializer(serializers.ModelSerializer):
+def get_recipe_image_url(name, image_processed, context):
+    view = context.get('view')
+    if image_processed and view is not None and view.action == 'list':
+        name = get_thumbnail_name(
+            name,
+            settings.RECIPE_IMAGE_LIST_THUMBNAIL,
+            settings.RECIPE_IMAGE_LIST_FORMAT
+        )
+    return get_image_url(name, context.get('request'))
+
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -27,13 +61,13 @@ class UserSerializer(serializers.ModelSerializer):
             'email', 'id', 'username', 'first_name',
             'last_name', 'is_subscribed'
         )
+        list_serializer_class = TimedListSerializer
 
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
-        user = request.user
-        return Follow.objects.filter(user=user, author=obj).exists()
+        return obj.id in get_user_relations(request).following
 
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
@@ -51,7 +85,7 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
 
 
 class CreateUpdateRecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField()
 
     class Meta:
@@ -59,15 +93,15 @@ class CreateUpdateRecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
-class RecipeListSerializer(serializers.ModelSerializer):
+class RecipeListSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     tags = TagSerializer(many=True)
     ingredients = RecipeIngredientSerializer(
         many=True, source='recipe'
     )
-    is_favorited = serializers.BooleanField(read_only=True)
-    is_in_shopping_cart = serializers.BooleanField(read_only=True)
-    image = Base64ImageField()
+    is_favorited = serializers.SerializerMethodField()
+    is_in_shopping_cart = serializers.SerializerMethodField()
+    image = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -76,15 +110,28 @@ class RecipeListSerializer(serializers.ModelSerializer):
             'is_favorited', 'is_in_shopping_cart',
             'name', 'image', 'text', 'cooking_time',
         )
+        list_serializer_class = TimedListSerializer
 
+    def get_is_favorited(self, obj):
+        request = self.context.get('request')
+        return obj.id in get_user_relations(request).favorites
+
+    def get_is_in_shopping_cart(self, obj):
+        request = self.context.get('request')
+        return obj.id in get_user_relations(request).shopping_cart
 
-class RecipeDetailSerializer(serializers.ModelSerializer):
+    def get_image(self, obj):
+        return get_recipe_image_url(
+            obj.image.name, obj.image_processed, self.context
+        )
+
+
+class RecipeDetailSerializer(TimedSerializerMixin,
+                             serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     ingredients = CreateUpdateRecipeIngredientSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True
-    )
-    image = Base64ImageField()
+    tags = serializers.ListField(child=serializers.IntegerField())
+    image = RecipeImageField()
 
     cooking_time = serializers.IntegerField(
         validators=(MinValueValidator(
@@ -95,35 +142,47 @@ class RecipeDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = '__all__'
+        read_only_fields = ('image_processed',)
 
     def validate_tags(self, data):
         if not data:
             raise exceptions.ValidationError(
                 'Нужно добавить хотя бы один тэг.'
             )
-        return data
-
-    def validate(self, data):
-        tags = data['tags']
-        if not tags:
-            return exceptions.ValidationError(
-                'Нужно добавить хотя бы один тэг.'
+        tag_ids = list(dict.fromkeys(data))
+        tags = Tag.objects.in_bulk(tag_ids)
+        missing = [tag_id for tag_id in tag_ids if tag_id not in tags]
+        if missing:
+            raise exceptions.ValidationError(
+                'Тэги не найдены: '
+                + ', '.join(str(tag_id) for tag_id in missing) + '.'
             )
+        return [tags[tag_id] for tag_id in tag_ids]
 
-        ingredients_recipe = data['ingredients']
-        ingredients_id = [item['id'] for item in ingredients_recipe]
-        for ingredient in ingredients_id:
-            if ingredients_id.count(ingredient) > 1:
+    def validate_ingredients(self, data):
+        ingredient_ids = set()
+        for item in data:
+            if item['id'] in ingredient_ids:
                 raise exceptions.ValidationError(
                     'У рецепта не может быть два одинаковых ингредиента.'
                 )
-
-        ingredient_amount = [item['amount'] for item in ingredients_recipe]
-        for amount in ingredient_amount:
-            if int(amount) <= 0:
+            ingredient_ids.add(item['id'])
+            if item['amount'] <= 0:
                 raise exceptions.ValidationError(
                     'Ошибка! Кол-во ингредиента указано 0 или меньше'
                 )
+        ingredients = Ingredient.objects.in_bulk(ingredient_ids)
+        missing = [
+            item['id'] for item in data if item['id'] not in ingredients
+        ]
+        if missing:
+            raise exceptions.ValidationError(
+                'Ингредиенты не найдены: '
+                + ', '.join(str(ingredient_id) for ingredient_id in missing)
+                + '.'
+            )
+        for item in data:
+            item['id'] = ingredients[item['id']]
         return data
 
     def create_recipe_ingredients(self, ingredients, recipe):
@@ -133,36 +192,132 @@ class RecipeDetailSerializer(serializers.ModelSerializer):
             amount=ingredient['amount']
         ) for ingredient in ingredients])
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
+        self.stage_image(validated_data)
         recipe = super().create(validated_data)
         recipe.tags.set(tags)
         self.create_recipe_ingredients(ingredients, recipe)
+        self.process_image(recipe)
         return recipe
 
+    def stage_image(self, validated_data):
+        validated_data['image'] = stage_image(
+            settings.RECIPE_IMAGE_STAGING_ROOT, validated_data['image']
+        )
+        validated_data['image_processed'] = False
+
+    def process_image(self, recipe):
+        transaction.on_commit(
+            partial(schedule_image_processing, recipe.image.name)
+        )
+
+    def update_shopping_cart_totals(self, amounts, current, recipe):
+        deltas = dict(amounts)
+        for ingredient_id, item in current.items():
+            deltas[ingredient_id] = deltas.get(ingredient_id, 0) - item.amount
+        ShoppingCartTotals.objects.apply(
+            recipe.shopping_cart_recipe.values_list('user_id', flat=True),
+            deltas
+        )
+
+    def update_recipe_ingredients(self, ingredients, recipe):
+        amounts = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        current = {
+            item.ingredient_id: item
+            for item in RecipeIngredient.objects.filter(recipe=recipe)
+        }
+        if amounts == {
+            ingredient_id: item.amount
+            for ingredient_id, item in current.items()
+        }:
+            return
+        self.update_shopping_cart_totals(amounts, current, recipe)
+
+        removed = current.keys() - amounts.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id, item in current.items():
+            amount = amounts.get(ingredient_id, item.amount)
+            if amount != item.amount:
+                item.amount = amount
+                changed.append(item)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        added = [
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        ]
+        if added:
+            RecipeIngredient.objects.bulk_create(added)
+
+    def update_recipe_tags(self, tags, recipe):
+        tag_ids = {tag.id for tag in tags}
+        current = set(
+            RecipeTag.objects.filter(recipe=recipe).values_list(
+                'tag_id', flat=True
+            )
+        )
+        if current - tag_ids:
+            RecipeTag.objects.filter(
+                recipe=recipe, tag_id__in=current - tag_ids
+            ).delete()
+        if tag_ids - current:
+            RecipeTag.objects.bulk_create(
+                RecipeTag(recipe=recipe, tag_id=tag_id)
+                for tag_id in tag_ids - current
+            )
+
+    @transaction.atomic
     def update(self, obj, validated_data):
+        Recipe.objects.select_for_update().filter(pk=obj.pk).exists()
         if 'ingredients' in validated_data:
-            ingredients = validated_data.pop('ingredients')
-            obj.ingredients.clear()
-            self.create_recipe_ingredients(ingredients, obj)
+            self.update_recipe_ingredients(
+                validated_data.pop('ingredients'), obj
+            )
         if 'tags' in validated_data:
-            tags = validated_data.pop('tags')
-            obj.tags.set(tags)
-        return super().update(obj, validated_data)
+            self.update_recipe_tags(validated_data.pop('tags'), obj)
+        if 'image' in validated_data:
+            self.stage_image(validated_data)
+        for field, value in validated_data.items():
+            setattr(obj, field, value)
+        if validated_data:
+            obj.save(update_fields=list(validated_data))
+        if 'image' in validated_data:
+            self.process_image(obj)
+        return obj
 
     def to_representation(self, instance):
-        serializer = RecipeListSerializer(instance)
+        serializer = RecipeListSerializer(instance, context=self.context)
         return serializer.data
 
 
-class RecipeFavoriteOrShoppingSerializer(serializers.ModelSerializer):
+class RecipeFavoriteOrShoppingSerializer(TimedSerializerMixin,
+                                         serializers.ModelSerializer):
+    image = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
 
+    def get_image(self, obj):
+        return get_recipe_image_url(
+            obj.image.name, obj.image_processed, self.context
+        )
+
 
-class FollowSerializer(serializers.ModelSerializer):
+class FollowSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     email = serializers.ReadOnlyField(source='author.email')
     id = serializers.ReadOnlyField(source='author.id')
     username = serializers.ReadOnlyField(source='author.username')
@@ -177,26 +332,20 @@ class FollowSerializer(serializers.ModelSerializer):
         fields = ('email', 'id', 'username', 'first_name', 'last_name',
                   'is_subscribed', 'recipes', 'recipes_count'
                   )
+        list_serializer_class = TimedListSerializer
 
     def get_is_subscribed(self, obj):
-        return Follow.objects.filter(user=obj.user, author=obj.author).exists()
+        request = self.context.get('request')
+        return obj.author_id in get_user_relations(request).following
 
     def get_recipes(self, obj):
-        author_recipes = Recipe.objects.filter(author=obj.author)
-
-        if 'recipes_limit' in self.context.get('request').GET:
-            recipes_limit = self.context.get('request').GET['recipes_limit']
-            author_recipes = author_recipes[:int(recipes_limit)]
-
-        if author_recipes:
-            serializer = RecipeFavoriteOrShoppingSerializer(
-                author_recipes,
-                context={'request': self.context.get('request')},
-                many=True
-            )
-            return serializer.data
-
-        return []
+        author_recipes = self.context.get('author_recipes', {})
+        serializer = RecipeFavoriteOrShoppingSerializer(
+            author_recipes.get(obj.author_id, []),
+            context={'request': self.context.get('request')},
+            many=True
+        )
+        return serializer.data
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.author).count()
+        return obj.recipes_count
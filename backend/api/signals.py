@@ -0,0 +1,73 @@
+import time
+from functools import partial
+
+from django.core.cache import cache
+from django.core.signals import request_finished, request_started
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+from .authentication import invalidate_token
+from .caching import TAGS_LIST_CACHE_KEY, invalidate_ingredients
+from .metrics import DB_RECONNECTS
+from .search import (ingredient_index, recipe_ingredient_index,
+                     recipe_search_index)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+    invalidate_ingredients()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags_cache(**kwargs):
+    cache.delete(TAGS_LIST_CACHE_KEY)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe_indexes(**kwargs):
+    transaction.on_commit(recipe_search_index.invalidate)
+    transaction.on_commit(recipe_ingredient_index.invalidate)
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def invalidate_recipe_ingredient_index(**kwargs):
+    transaction.on_commit(recipe_ingredient_index.invalidate)
+
+
+@receiver(request_started)
+def check_database_connections(**kwargs):
+    now = time.monotonic()
+    for connection in connections.all():
+        if (connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                and connection.connection is not None
+                and now - getattr(connection, 'idle_since', 0)
+                > connection.settings_dict.get('CONN_HEALTH_CHECK_AGE', 0)
+                and not connection.is_usable()):
+            connection.close()
+            DB_RECONNECTS.inc({'database': connection.alias})
+
+
+@receiver(request_finished)
+def mark_database_connections_idle(**kwargs):
+    now = time.monotonic()
+    for connection in connections.all():
+        connection.idle_since = now
+
+
+@receiver((post_save, post_delete), sender=Token)
+def invalidate_cached_token(instance, **kwargs):
+    transaction.on_commit(partial(invalidate_token, instance.key))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(instance, **kwargs):
+    for key in Token.objects.filter(user=instance).values_list(
+        'key', flat=True
+    ):
+        transaction.on_commit(partial(invalidate_token, key))
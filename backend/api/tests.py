@@ -0,0 +1,736 @@
+import base64
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.backends.postgresql import base, creation
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from PIL import Image, ImageFile
+from psycopg2 import extensions
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api import db_routers, signals
+from api.backends.postgresql_pool import base as pool_base
+from api.backends.postgresql_pool.base import ConnectionPool
+from api.images import (THUMBNAILS_DIR, get_thumbnail_name, is_staged_name,
+                        process_image, schedule_image_processing)
+from api.middleware import (ReplicaRoutingMiddleware, get_primary_sticky_keys,
+                            measure_serialization)
+from api.serializers import RecipeDetailSerializer
+from recipes.admin import RecipeAdmin
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.storage import is_content_addressed_name
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+STAGING_ROOT = tempfile.mkdtemp()
+
+
+def make_image(image_format='PNG', **kwargs):
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), 'red').save(
+        buffer, format=image_format, **kwargs
+    )
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    RECIPE_IMAGE_STAGING_ROOT=STAGING_ROOT,
+    RECIPE_IMAGE_WORKERS=0,
+)
+class APITestCase(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(STAGING_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user('author')
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тэг {index}', color=f'#00000{index}', slug=f'tag{index}'
+            )
+            for index in range(2)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'ингредиент {index}', measurement_unit='г'
+            )
+            for index in range(3)
+        ]
+
+    @classmethod
+    def create_user(cls, username):
+        return User.objects.create_user(
+            username=username,
+            email=f'{username}@example.com',
+            password='benchmark-password',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+
+    def get_client(self, user=None):
+        client = APIClient()
+        if user is not None:
+            token, _ = Token.objects.get_or_create(user=user)
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def get_recipe_data(self, **kwargs):
+        data = {
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'image': f'data:image/png;base64,{make_image()}',
+            'tags': [tag.id for tag in self.tags],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': index + 1}
+                for index, ingredient in enumerate(self.ingredients)
+            ],
+        }
+        data.update(kwargs)
+        return data
+
+    def create_recipe(self, user=None, **kwargs):
+        response = self.get_client(user or self.user).post(
+            '/api/recipes/', self.get_recipe_data(**kwargs), format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        return Recipe.objects.get(id=response.json()['id'])
+
+
+class RecipeImageTest(APITestCase):
+    def publish(self, recipe):
+        schedule_image_processing(recipe.image.name)
+        recipe.refresh_from_db()
+        return recipe
+
+    def read_image(self, recipe):
+        with open(recipe.image.path, 'rb') as file:
+            return file.read()
+
+    def test_extension_is_taken_from_image_format(self):
+        recipe = self.create_recipe(
+            image=f'data:text/html;base64,{make_image("PNG")}'
+        )
+        self.assertTrue(recipe.image.name.endswith('.png'))
+
+        recipe = self.create_recipe(
+            image=f'data:image/png;base64,{make_image("JPEG")}'
+        )
+        self.assertTrue(recipe.image.name.endswith('.jpg'))
+
+    def test_non_image_is_rejected(self):
+        response = self.get_client(self.user).post(
+            '/api/recipes/',
+            self.get_recipe_data(image='data:image/png;base64,PGh0bWw+'),
+            format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.json())
+
+    def test_upload_is_staged_outside_media(self):
+        with mock.patch.object(ImageFile.ImageFile, 'load') as load:
+            recipe = self.create_recipe()
+        load.assert_not_called()
+        self.assertTrue(is_staged_name(recipe.image.name))
+        staged_path = os.path.join(STAGING_ROOT, recipe.image.name)
+        self.assertTrue(os.path.exists(staged_path))
+        self.assertFalse(os.path.exists(os.path.join(
+            MEDIA_ROOT, recipe.image.name
+        )))
+        response = self.get_client().get(f'/api/recipes/{recipe.id}/')
+        self.assertIsNone(response.json()['image'])
+
+        recipe = self.publish(recipe)
+        self.assertTrue(recipe.image_processed)
+        self.assertTrue(is_content_addressed_name(recipe.image.name))
+        self.assertFalse(os.path.exists(staged_path))
+        response = self.get_client().get(f'/api/recipes/{recipe.id}/')
+        self.assertTrue(response.json()['image'].endswith(recipe.image.name))
+
+    def test_jpeg_metadata_is_stripped_without_recompression(self):
+        exif = Image.Exif()
+        exif[0x0110] = 'Camera'
+        data = make_image('JPEG', exif=exif.tobytes())
+        recipe = self.publish(
+            self.create_recipe(image=f'data:image/jpeg;base64,{data}')
+        )
+        with Image.open(recipe.image.path) as image:
+            self.assertNotIn('exif', image.info)
+        scan = base64.b64decode(data).split(b'\xff\xda', 1)[1]
+        self.assertTrue(self.read_image(recipe).endswith(scan))
+
+    def test_png_and_webp_metadata_is_stripped(self):
+        exif = Image.Exif()
+        exif[0x0110] = 'Camera'
+        for image_format in ('PNG', 'WEBP'):
+            with self.subTest(image_format=image_format):
+                recipe = self.publish(self.create_recipe(image=(
+                    'data:image/png;base64,'
+                    + make_image(image_format, exif=exif.tobytes())
+                )))
+                with Image.open(recipe.image.path) as image:
+                    image.load()
+                    self.assertFalse(image.getexif())
+                self.assertNotIn(b'Camera', self.read_image(recipe))
+
+    def test_admin_image_change_is_staged_and_processed(self):
+        recipe = self.publish(self.create_recipe())
+        exif = Image.Exif()
+        exif[0x0110] = 'Camera'
+        upload = SimpleUploadedFile('photo.jpg', base64.b64decode(
+            make_image('JPEG', exif=exif.tobytes())
+        ))
+        form = mock.Mock(
+            changed_data=['image'], cleaned_data={'image': upload}
+        )
+        with mock.patch.object(transaction, 'on_commit') as on_commit:
+            RecipeAdmin(Recipe, admin.site).save_model(
+                None, recipe, form, True
+            )
+        recipe.refresh_from_db()
+        self.assertTrue(is_staged_name(recipe.image.name))
+        self.assertFalse(recipe.image_processed)
+
+        on_commit.call_args[0][0]()
+        recipe.refresh_from_db()
+        self.assertTrue(recipe.image_processed)
+        self.assertTrue(is_content_addressed_name(recipe.image.name))
+        self.assertNotIn(b'Camera', self.read_image(recipe))
+
+    def test_animated_gif_keeps_frames(self):
+        buffer = io.BytesIO()
+        frames = [
+            Image.new('RGB', (8, 8), color)
+            for color in ('red', 'green', 'blue')
+        ]
+        frames[0].save(
+            buffer, format='GIF', save_all=True, append_images=frames[1:],
+            comment=b'Camera', loop=0
+        )
+        data = base64.b64encode(buffer.getvalue()).decode()
+        recipe = self.publish(
+            self.create_recipe(image=f'data:image/gif;base64,{data}')
+        )
+        with Image.open(recipe.image.path) as image:
+            self.assertEqual(image.n_frames, 3)
+            self.assertNotIn('comment', image.info)
+
+    def test_thumbnails_are_written_atomically(self):
+        recipe = self.create_recipe()
+        sizes = {'small': 4}
+        name = process_image(
+            MEDIA_ROOT, STAGING_ROOT, recipe.image.name, sizes
+        )
+        self.assertTrue(is_content_addressed_name(name))
+        for extension in ('webp', 'jpeg'):
+            self.assertTrue(os.path.exists(os.path.join(
+                MEDIA_ROOT, get_thumbnail_name(name, 'small', extension)
+            )))
+        thumbnails_dir = os.path.join(MEDIA_ROOT, THUMBNAILS_DIR)
+        self.assertFalse([
+            name for name in os.listdir(thumbnails_dir)
+            if name.endswith('.tmp')
+        ])
+
+
+class InstrumentationTest(APITestCase):
+    def test_streamed_queries_are_counted(self):
+        client = self.get_client(self.user)
+        with mock.patch('api.middleware.REQUEST_QUERIES') as queries:
+            with CaptureQueriesContext(connection) as captured:
+                response = client.get('/api/recipes/download_shopping_cart/')
+                queries.observe.assert_not_called()
+                b''.join(response.streaming_content)
+        queries.observe.assert_called_once()
+        counted = queries.observe.call_args[0][1]
+        self.assertEqual(counted, len(captured))
+        self.assertIn('shoppingcarttotals', captured[-1]['sql'].lower())
+
+    def test_serialization_is_timed_separately_from_rendering(self):
+        self.create_recipe()
+        client = self.get_client(self.user)
+        for fast in (True, False):
+            with self.subTest(fast=fast), self.settings(
+                RECIPE_FAST_SERIALIZATION=fast
+            ), mock.patch(
+                'api.middleware.RESPONSE_SERIALIZE_DURATION'
+            ) as serialize, mock.patch(
+                'api.middleware.RESPONSE_RENDER_DURATION'
+            ) as render:
+                client.get('/api/recipes/')
+                serialize.observe.assert_called_once()
+                render.observe.assert_called_once()
+                labels, duration = serialize.observe.call_args[0]
+                self.assertEqual(labels['view'], 'RecipesViewSet.list')
+                self.assertGreater(duration, 0)
+
+    def test_nested_serializers_are_timed_once(self):
+        request = RequestFactory().get('/')
+        with measure_serialization(request):
+            with measure_serialization(request):
+                pass
+            self.assertFalse(hasattr(request, 'instrumentation_serialize'))
+        self.assertGreater(request.instrumentation_serialize, 0)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.router = db_routers.PrimaryReplicaRouter()
+        self.routes = []
+
+    def get_response(self, request):
+        self.routes.append(self.router.db_for_read(None))
+        return HttpResponse()
+
+    def get_streaming_response(self, request):
+        return StreamingHttpResponse(
+            self.router.db_for_read(None) for _ in range(2)
+        )
+
+    def test_router_reads_from_primary_only_when_requested(self):
+        self.assertEqual(self.router.db_for_read(None), 'replica')
+        with db_routers.use_primary():
+            self.assertEqual(self.router.db_for_read(None), 'default')
+        self.assertEqual(self.router.db_for_write(None), 'default')
+
+    def test_sticky_keys_ignore_client_address(self):
+        request = self.factory.get('/', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(get_primary_sticky_keys(request), [])
+        request = self.factory.get(
+            '/', HTTP_AUTHORIZATION='Token key', HTTP_X_REAL_IP='10.0.0.1'
+        )
+        self.assertEqual(len(get_primary_sticky_keys(request)), 1)
+
+    def test_reads_after_write_stick_to_primary(self):
+        middleware = ReplicaRoutingMiddleware(self.get_response)
+        middleware(self.factory.get('/', HTTP_AUTHORIZATION='Token key'))
+        middleware(self.factory.post('/', HTTP_AUTHORIZATION='Token key'))
+        middleware(self.factory.get('/', HTTP_AUTHORIZATION='Token key'))
+        middleware(self.factory.get('/', HTTP_AUTHORIZATION='Token other'))
+        self.assertEqual(
+            self.routes, ['replica', 'default', 'default', 'replica']
+        )
+
+    def test_shared_address_does_not_stick(self):
+        middleware = ReplicaRoutingMiddleware(self.get_response)
+        middleware(self.factory.post('/', REMOTE_ADDR='10.0.0.1'))
+        middleware(self.factory.get('/', REMOTE_ADDR='10.0.0.1'))
+        self.assertEqual(self.routes, ['default', 'replica'])
+
+    def test_replicas_require_shared_cache(self):
+        result = subprocess.run(
+            (sys.executable, '-c', 'import foodgram.settings'),
+            cwd=settings.BASE_DIR,
+            env={
+                **os.environ,
+                'DB_REPLICAS': 'replica.sqlite3',
+                'CACHE_BACKEND':
+                    'django.core.cache.backends.locmem.LocMemCache',
+            },
+            capture_output=True,
+        )
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn(b'ImproperlyConfigured', result.stderr)
+
+    def test_streamed_reads_keep_routing(self):
+        cache.set(
+            get_primary_sticky_keys(
+                self.factory.get('/', HTTP_AUTHORIZATION='Token key')
+            )[0],
+            True
+        )
+        middleware = ReplicaRoutingMiddleware(self.get_streaming_response)
+        response = middleware(
+            self.factory.get('/', HTTP_AUTHORIZATION='Token key')
+        )
+        self.assertEqual(
+            list(response.streaming_content), [b'default', b'default']
+        )
+
+
+@override_settings(TOKEN_AUTH_CACHE_TIMEOUT=60)
+class CachedTokenAuthenticationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def get_auth_queries(self, client):
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(client.get('/api/users/me/').status_code, 200)
+        return [
+            query['sql'] for query in captured
+            if 'authtoken_token' in query['sql']
+            or 'FROM "users_user"' in query['sql']
+        ]
+
+    def test_cache_hit_does_not_query_database(self):
+        client = self.get_client(self.user)
+        self.assertEqual(len(self.get_auth_queries(client)), 1)
+        self.assertEqual(self.get_auth_queries(client), [])
+        response = client.get('/api/users/me/')
+        self.assertEqual(response.json()['username'], self.user.username)
+
+    def test_saving_user_invalidates_cache(self):
+        client = self.get_client(self.user)
+        self.get_auth_queries(client)
+        self.user.is_active = False
+        with mock.patch.object(
+            transaction, 'on_commit', side_effect=lambda callback: callback()
+        ):
+            self.user.save()
+        self.assertEqual(client.get('/api/users/me/').status_code, 401)
+
+
+class UserRelationsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.favorite = self.create_recipe()
+        self.in_cart = self.create_recipe()
+        self.reader = self.create_user('reader')
+        self.client = self.get_client(self.reader)
+        self.client.post(f'/api/recipes/{self.favorite.id}/favorite/')
+        self.client.post(f'/api/recipes/{self.in_cart.id}/shopping_cart/')
+        self.client.post(f'/api/users/{self.user.id}/subscribe/')
+
+    def get_flags(self, query=''):
+        response = self.client.get(f'/api/recipes/{query}')
+        self.assertEqual(response.status_code, 200)
+        return {
+            recipe['id']: (
+                recipe['is_favorited'],
+                recipe['is_in_shopping_cart'],
+                recipe['author']['is_subscribed'],
+            )
+            for recipe in response.json()['results']
+        }
+
+    def check_flags(self):
+        self.assertEqual(self.get_flags(), {
+            self.favorite.id: (True, False, True),
+            self.in_cart.id: (False, True, True),
+        })
+        self.assertEqual(
+            list(self.get_flags('?is_favorited=1')), [self.favorite.id]
+        )
+        self.assertEqual(
+            list(self.get_flags('?is_in_shopping_cart=1')), [self.in_cart.id]
+        )
+        response = self.client.get(f'/api/recipes/{self.favorite.id}/')
+        self.assertTrue(response.json()['is_favorited'])
+        self.assertFalse(response.json()['is_in_shopping_cart'])
+
+    def test_flags_and_filters(self):
+        for fast in (False, True):
+            for timeout in (0, 60):
+                with self.subTest(fast=fast, timeout=timeout):
+                    with override_settings(
+                        RECIPE_FAST_SERIALIZATION=fast,
+                        USER_RELATIONS_CACHE_TIMEOUT=timeout,
+                    ):
+                        self.check_flags()
+
+    def test_relations_are_limited_to_page(self):
+        for fast in (False, True):
+            with self.subTest(fast=fast):
+                with override_settings(RECIPE_FAST_SERIALIZATION=fast):
+                    with CaptureQueriesContext(connection) as captured:
+                        self.get_flags()
+                relation_queries = [
+                    query['sql'] for query in captured
+                    if 'favoriterecipe' in query['sql']
+                    or 'shoppingcart"' in query['sql']
+                    or 'users_follow' in query['sql']
+                ]
+                self.assertEqual(len(relation_queries), 3)
+                for sql in relation_queries:
+                    self.assertIn(' IN (', sql)
+
+
+class IngredientCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_warm_requests_do_not_query_database(self):
+        client = self.get_client()
+        for url in ('/api/ingredients/', '/api/ingredients/?name=ингр'):
+            client.get(url)
+            with self.assertNumQueries(0):
+                self.assertEqual(client.get(url).status_code, 200)
+
+    def test_loaded_ingredients_are_visible(self):
+        client = self.get_client()
+        self.assertEqual(len(client.get('/api/ingredients/').json()), 3)
+        self.assertEqual(client.get('/api/ingredients/?name=соль').json(), [])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'ingredients.csv')
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write('соль,г\n')
+            call_command('load_ingredients', path, stdout=io.StringIO())
+        self.assertEqual(len(client.get('/api/ingredients/').json()), 4)
+        self.assertEqual(
+            [item['name'] for item in client.get(
+                '/api/ingredients/?name=соль'
+            ).json()],
+            ['соль']
+        )
+
+
+class DatabaseHealthCheckTest(SimpleTestCase):
+    def get_connection(self, idle_for):
+        return mock.Mock(
+            settings_dict={
+                'CONN_HEALTH_CHECKS': True, 'CONN_HEALTH_CHECK_AGE': 30
+            },
+            idle_since=time.monotonic() - idle_for,
+        )
+
+    def test_only_idle_connections_are_checked(self):
+        recent = self.get_connection(idle_for=1)
+        idle = self.get_connection(idle_for=60)
+        with mock.patch.object(signals, 'connections') as connections:
+            connections.all.return_value = [recent, idle]
+            signals.check_database_connections()
+        recent.is_usable.assert_not_called()
+        idle.is_usable.assert_called_once()
+
+    def test_pool_checks_only_idle_connections(self):
+        pool = ConnectionPool('default', max_size=1, timeout=1, check_age=30)
+        connection = mock.MagicMock(closed=False)
+        connection.get_transaction_status.return_value = (
+            extensions.TRANSACTION_STATUS_IDLE
+        )
+        pool.acquire(lambda: connection)
+        pool.release(connection)
+        self.assertIs(pool.acquire(mock.Mock()), connection)
+        connection.cursor.assert_not_called()
+        pool.release(connection)
+        with mock.patch('time.monotonic', return_value=time.monotonic() + 60):
+            self.assertIs(pool.acquire(mock.Mock()), connection)
+        connection.cursor.assert_called_once()
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    def setUp(self):
+        pool_base.close_pools()
+        self.addCleanup(pool_base.close_pools)
+
+    def get_connection(self):
+        connection = mock.MagicMock(closed=False)
+        connection.get_transaction_status.return_value = (
+            extensions.TRANSACTION_STATUS_IDLE
+        )
+        return connection
+
+    def get_wrapper(self, name):
+        return pool_base.DatabaseWrapper({
+            **connections['default'].settings_dict,
+            'ENGINE': 'api.backends.postgresql_pool',
+            'NAME': name,
+        }, 'pooled')
+
+    def test_close_all_closes_idle_and_returned_connections(self):
+        pool = ConnectionPool('default', max_size=2, timeout=1)
+        idle, busy = self.get_connection(), self.get_connection()
+        pool.acquire(lambda: idle)
+        pool.acquire(lambda: busy)
+        pool.release(idle)
+        pool.close_all()
+        idle.close.assert_called_once()
+        pool.release(busy)
+        busy.close.assert_called_once()
+
+    def test_pools_are_keyed_on_connection_parameters(self):
+        first = self.get_wrapper('first')
+        second = self.get_wrapper('second')
+        connection = self.get_connection()
+        with mock.patch.object(
+            base.DatabaseWrapper, 'get_new_connection',
+            side_effect=[connection, self.get_connection()]
+        ):
+            first.connect()
+            first.close()
+            second.connect()
+        self.assertIsNot(second.connection, connection)
+        self.assertIsNot(first.connection_pool, second.connection_pool)
+
+    def test_connection_is_closed_when_settings_change(self):
+        wrapper = self.get_wrapper('first')
+        connection = self.get_connection()
+        with mock.patch.object(
+            base.DatabaseWrapper, 'get_new_connection',
+            return_value=connection
+        ):
+            wrapper.connect()
+        wrapper.settings_dict['NAME'] = 'test_first'
+        wrapper.close()
+        connection.close.assert_called_once()
+
+    def test_test_database_teardown_closes_pools(self):
+        wrapper = self.get_wrapper('test_first')
+        connection = self.get_connection()
+        with mock.patch.object(
+            base.DatabaseWrapper, 'get_new_connection',
+            return_value=connection
+        ):
+            wrapper.connect()
+        with mock.patch.object(
+            creation.DatabaseCreation, '_destroy_test_db'
+        ) as destroy:
+            wrapper.creation.destroy_test_db(verbosity=0)
+        connection.close.assert_called_once()
+        destroy.assert_called_once_with('test_first', 0)
+
+
+class SubscriptionsTest(APITestCase):
+    def test_recipes_limit(self):
+        self.create_recipe()
+        self.create_recipe()
+        client = self.get_client(self.create_user('reader'))
+        client.post(f'/api/users/{self.user.id}/subscribe/')
+        response = client.get('/api/users/subscriptions/?recipes_limit=1')
+        self.assertEqual(len(response.json()['results'][0]['recipes']), 1)
+        for value in ('abc', '-1'):
+            with self.subTest(value=value):
+                response = client.get(
+                    f'/api/users/subscriptions/?recipes_limit={value}'
+                )
+                self.assertEqual(response.status_code, 400)
+        author = self.create_user('other')
+        response = client.post(
+            f'/api/users/{author.id}/subscribe/?recipes_limit=abc'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(author.following.exists())
+
+
+class RecipeQueryCountTest(APITestCase):
+    def check_query_counts(self):
+        recipe = Recipe.objects.latest('id')
+        reader = self.create_user(f'reader{Recipe.objects.count()}')
+        for user, list_queries, detail_queries in (
+            (None, 4, 3), (reader, 8, 7)
+        ):
+            client = self.get_client(user)
+            with self.assertNumQueries(list_queries):
+                client.get('/api/recipes/')
+            with self.assertNumQueries(detail_queries):
+                client.get(f'/api/recipes/{recipe.id}/')
+
+    def test_query_counts_do_not_grow_with_recipes(self):
+        other = self.create_user('other')
+        for fast in (False, True):
+            with self.subTest(fast=fast):
+                with override_settings(RECIPE_FAST_SERIALIZATION=fast):
+                    self.create_recipe()
+                    self.check_query_counts()
+                    for _ in range(3):
+                        self.create_recipe(other)
+                    self.check_query_counts()
+
+
+class RecipeFastSerializationTest(APITestCase):
+    def test_fast_path_matches_serializers(self):
+        other = self.create_user('other')
+        recipes = [self.create_recipe(), self.create_recipe(other)]
+        self.create_recipe(other, tags=[self.tags[0].id])
+        reader = self.create_user('reader')
+        reader_client = self.get_client(reader)
+        reader_client.post(f'/api/recipes/{recipes[0].id}/favorite/')
+        reader_client.post(f'/api/recipes/{recipes[1].id}/shopping_cart/')
+        reader_client.post(f'/api/users/{other.id}/subscribe/')
+        urls = [
+            '/api/recipes/',
+            '/api/recipes/?page=2&limit=2',
+            '/api/recipes/?pagination=cursor&limit=2',
+            f'/api/recipes/?tags={self.tags[1].slug}',
+            f'/api/recipes/?author={other.id}',
+            '/api/recipes/?is_favorited=1',
+            '/api/recipes/?is_in_shopping_cart=1',
+        ] + [f'/api/recipes/{recipe.id}/' for recipe in recipes]
+        for user in (None, reader):
+            client = self.get_client(user)
+            for url in urls:
+                with self.subTest(user=user, url=url):
+                    responses = []
+                    for fast in (False, True):
+                        with override_settings(
+                            RECIPE_FAST_SERIALIZATION=fast
+                        ):
+                            responses.append(client.get(url))
+                    self.assertEqual(responses[0].status_code, 200)
+                    self.assertEqual(
+                        responses[0].json(), responses[1].json()
+                    )
+
+
+class RecipeCountersTest(APITestCase):
+    def setUp(self):
+        self.recipe = self.create_recipe()
+        self.stale = Recipe.objects.get(pk=self.recipe.pk)
+        reader = self.get_client(self.create_user('reader'))
+        reader.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        reader.post(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+
+    def assert_counters_kept(self):
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.name, 'Новое название')
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(self.recipe.cart_count, 1)
+
+    def test_serializer_update_keeps_counters(self):
+        serializer = RecipeDetailSerializer(
+            self.stale, data={'name': 'Новое название'}, partial=True
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.assert_counters_kept()
+
+    def cook(self, ingredient):
+        response = self.get_client().get(
+            f'/api/recipes/cook/?ingredients={ingredient.id}'
+        )
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_ingredient_only_update_refreshes_index(self):
+        first, second = self.ingredients[:2]
+        self.assertEqual(self.cook(first), [self.recipe.id])
+        with mock.patch.object(
+            transaction, 'on_commit', side_effect=lambda callback: callback()
+        ):
+            response = self.get_client(self.user).patch(
+                f'/api/recipes/{self.recipe.id}/',
+                {'ingredients': [{'id': second.id, 'amount': 1}]},
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.cook(first), [])
+        self.assertEqual(self.cook(second), [self.recipe.id])
+
+    def test_admin_change_keeps_counters(self):
+        self.stale.name = 'Новое название'
+        RecipeAdmin(Recipe, admin.site).save_model(
+            None, self.stale, mock.Mock(changed_data=['name', 'tags']), True
+        )
+        self.assert_counters_kept()
@@ -1,8 +1,8 @@
 from django.urls import include, path
 from rest_framework import routers
 
-from .views import (IngredientsViewSet, RecipesViewSet, TagsViewSet,
-                    UsersViewSet)
+from .views import (IngredientsViewSet, MetricsView, RecipesViewSet,
+                    TagsViewSet, UsersViewSet)
 
 app_name = 'api'
 
@@ -13,6 +13,7 @@ router.register('recipes', RecipesViewSet, basename='recipes')
 router.register('ingredients', IngredientsViewSet, basename='ingredients')
 
 urlpatterns = [
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
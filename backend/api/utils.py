@@ -1,8 +1,28 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.response import Response
 
-from recipes.models import Recipe
+from recipes.models import (FavoriteRecipe, Recipe, ShoppingCart,
+                            ShoppingCartTotals)
+from .relations import invalidate_user_relations
+
+RECIPE_COUNTERS = {
+    FavoriteRecipe: 'favorites_count',
+    ShoppingCart: 'cart_count',
+}
+
+
+def update_recipe_counter(model, recipe, delta):
+    counter = RECIPE_COUNTERS.get(model)
+    if counter is not None:
+        Recipe.objects.filter(pk=recipe.pk).update(
+            **{counter: F(counter) + delta}
+        )
 
 
 def create_delete_object(request, pk, model, model_serializer):
@@ -10,7 +30,12 @@ def create_delete_object(request, pk, model, model_serializer):
     recipe = get_object_or_404(Recipe, id=pk)
 
     if request.method == 'POST':
-        model.objects.create(user=user, recipe=recipe)
+        with transaction.atomic():
+            model.objects.create(user=user, recipe=recipe)
+            update_recipe_counter(model, recipe, 1)
+            if model is ShoppingCart:
+                ShoppingCartTotals.objects.add_recipe(user, recipe)
+        invalidate_user_relations(request)
         serializer = model_serializer(
             recipe,
             context={'request': request}
@@ -23,7 +48,37 @@ def create_delete_object(request, pk, model, model_serializer):
             user=user,
             recipe=recipe
         )
-        recipe_object.delete()
+        with transaction.atomic():
+            recipe_object.delete()
+            update_recipe_counter(model, recipe, -1)
+            if model is ShoppingCart:
+                ShoppingCartTotals.objects.remove_recipe((user.id,), recipe)
+        invalidate_user_relations(request)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+def get_author_recipes(author_ids, recipes_limit=None):
+    recipes = Recipe.objects.filter(author__in=author_ids)
+    if recipes_limit is not None:
+        windowed = recipes.annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=[F('author')],
+                order_by=[F('pub_date').desc(), F('id').desc()],
+            )
+        ).values(
+            'id', 'name', 'image', 'image_processed', 'cooking_time',
+            'author_id', 'row_number'
+        )
+        sql, params = windowed.query.sql_with_params()
+        recipes = Recipe.objects.raw(
+            f'SELECT * FROM ({sql}) AS windowed '
+            f'WHERE row_number <= %s ORDER BY row_number',
+            params + (recipes_limit,)
+        )
+    author_recipes = defaultdict(list)
+    for recipe in recipes:
+        author_recipes[recipe.author_id].append(recipe)
+    return author_recipes
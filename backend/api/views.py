@@ -1,46 +1,80 @@
+from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db.models import Sum
-from django.db.models.expressions import Exists, OuterRef
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import Count, Prefetch
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
-from rest_framework import status, viewsets
+from rest_framework import exceptions, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.permissions import (SAFE_METHODS, IsAdminUser,
+                                        IsAuthenticated)
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
-                            RecipeIngredient, ShoppingCart, Tag)
+                            RecipeIngredient, ShoppingCart, ShoppingCartTotals,
+                            Tag)
 from users.models import Follow, User
+
+from .caching import (TAGS_LIST_CACHE_KEY, CachedListMixin,
+                      get_ingredients_list_cache_key)
+from .exporters import get_shopping_list_exporter
+from .fast_serializers import RECIPE_VALUES, RecipeValuesSerializer
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import StandardPageNumberPagination
+from .metrics import render_metrics
+from .pagination import RecipeCursorPagination, StandardPageNumberPagination
 from .permissions import IsAuthorOrAdminPermission
+from .relations import invalidate_user_relations, prefetch_user_relations
+from .search import ingredient_index, recipe_ingredient_index
 from .serializers import (FollowSerializer, IngredientSerializer,
                           RecipeDetailSerializer,
                           RecipeFavoriteOrShoppingSerializer,
                           RecipeListSerializer, TagSerializer, UserSerializer)
-from .utils import create_delete_object
+from .utils import create_delete_object, get_author_recipes
 
 
-class TagsViewSet(viewsets.ModelViewSet):
+class TagsViewSet(CachedListMixin, viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    list_cache_key = TAGS_LIST_CACHE_KEY
 
 
-class IngredientsViewSet(viewsets.ModelViewSet):
+class IngredientsViewSet(CachedListMixin, viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (IngredientFilter,)
     search_fields = ('^name',)
     pagination_class = None
 
+    def get_list_cache_key(self):
+        return get_ingredients_list_cache_key()
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get(IngredientFilter.search_param)
+        if name:
+            return Response(ingredient_index.search(name))
+        return super().list(request, *args, **kwargs)
+
 
 class RecipesViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     filter_class = RecipeFilter
     permission_classes = (IsAuthorOrAdminPermission,)
     pagination_class = StandardPageNumberPagination
+    cursor_pagination_class = RecipeCursorPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if (self.action == 'list' and self.request.query_params.get(
+                'pagination'
+            ) == 'cursor'):
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
@@ -48,33 +82,95 @@ class RecipesViewSet(viewsets.ModelViewSet):
         return RecipeDetailSerializer
 
     def get_queryset(self):
-        active_queryset = Recipe.objects.select_related(
+        return Recipe.objects.defer(
+            'search_vector'
+        ).select_related(
             'author'
         ).prefetch_related(
             'tags',
-            'ingredients',
-            'recipe',
-            'shopping_cart_recipe',
-            'favorite_recipe',
-        )
-        if self.request.user.is_authenticated:
-            active_queryset = active_queryset.annotate(
-                is_favorited=Exists(
-                    FavoriteRecipe.objects.filter(
-                        user=self.request.user, recipe=OuterRef('id')
-                    )
-                ),
-                is_in_shopping_cart=Exists(
-                    ShoppingCart.objects.filter(
-                        user=self.request.user, recipe=OuterRef('id')
-                    )
-                ),
+            Prefetch(
+                'recipe',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+        )
+
+    def get_serializer(self, *args, **kwargs):
+        if kwargs.get('many'):
+            prefetch_user_relations(
+                self.request,
+                [recipe.id for recipe in args[0]],
+                [recipe.author_id for recipe in args[0]]
             )
-        return active_queryset
+        return super().get_serializer(*args, **kwargs)
+
+    def get_values_queryset(self):
+        return self.filter_queryset(
+            Recipe.objects.all()
+        ).values(*RECIPE_VALUES)
+
+    def list(self, request, *args, **kwargs):
+        if not settings.RECIPE_FAST_SERIALIZATION:
+            return super().list(request, *args, **kwargs)
+        page = self.paginate_queryset(self.get_values_queryset())
+        serializer = RecipeValuesSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not settings.RECIPE_FAST_SERIALIZATION:
+            return super().retrieve(request, *args, **kwargs)
+        recipe = get_object_or_404(
+            self.get_values_queryset(),
+            **{self.lookup_field: self.kwargs[self.lookup_field]}
+        )
+        serializer = RecipeValuesSerializer(
+            recipe, context=self.get_serializer_context()
+        )
+        return Response(serializer.data)
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def perform_update(self, serializer):
+        serializer.save()
+        transaction.on_commit(recipe_ingredient_index.invalidate)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        ShoppingCartTotals.objects.remove_recipe(
+            instance.shopping_cart_recipe.values_list('user_id', flat=True),
+            instance
+        )
+        instance.delete()
+
+    @action(detail=False, methods=('get',))
+    def cook(self, request):
+        try:
+            ingredient_ids = [
+                int(ingredient_id)
+                for ingredient_id in request.query_params.getlist(
+                    'ingredients'
+                )
+            ]
+            max_missing = request.query_params.get('max_missing')
+            if max_missing is not None:
+                max_missing = int(max_missing)
+        except ValueError:
+            raise exceptions.ValidationError(
+                'Ингредиенты и max_missing должны быть целыми числами.'
+            )
+        recipe_ids = self.paginate_queryset(
+            recipe_ingredient_index.search(ingredient_ids, max_missing)
+        )
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id in recipe_ids
+             if recipe_id in recipes],
+            many=True
+        )
+        return self.get_paginated_response(serializer.data)
+
     @action(
         detail=True,
         methods=('post', 'delete'),
@@ -103,26 +199,25 @@ class RecipesViewSet(viewsets.ModelViewSet):
         permission_classes=(IsAuthenticated,)
     )
     def download_shopping_cart(self, request):
-        ingredients_buy = RecipeIngredient.objects.filter(
-            recipe__shopping_cart_recipe__user=request.user
+        ingredients_buy = ShoppingCartTotals.objects.filter(
+            user=request.user
         ).order_by(
             'ingredient__name'
-        ).values(
+        ).values_list(
             'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(ingredient_all_amount=Sum('amount'))
-
-        buy_list_text = 'Список покупок с сайта Foodgram:\n\n'
-        for item in ingredients_buy:
-            buy_list_text += (
-                f'{item["ingredient__name"]} - '
-                f'{item["ingredient_all_amount"]} '
-                f'{item["ingredient__measurement_unit"]}\n'
-            )
+            'ingredient__measurement_unit',
+            'amount'
+        )
 
-        response = HttpResponse(buy_list_text, content_type='text/plain')
+        exporter_class = get_shopping_list_exporter(
+            request.query_params.get('type', 'txt')
+        )
+        exporter = exporter_class(ingredients_buy.iterator())
+        response = StreamingHttpResponse(
+            exporter.render(), content_type=exporter.content_type
+        )
         response['Content-Disposition'] = (
-            'attachment; filename=shopping-list.txt'
+            f'attachment; filename={exporter.filename}'
         )
         return response
 
@@ -131,6 +226,37 @@ class UsersViewSet(UserViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
 
+    def get_serializer(self, *args, **kwargs):
+        if kwargs.get('many') and self.action == 'list':
+            prefetch_user_relations(
+                self.request, author_ids=[user.id for user in args[0]]
+            )
+        return super().get_serializer(*args, **kwargs)
+
+    def get_follow_queryset(self, user):
+        return Follow.objects.filter(user=user).select_related(
+            'author'
+        ).annotate(recipes_count=Count('author__recipe'))
+
+    def get_recipes_limit(self, request):
+        recipes_limit = request.query_params.get('recipes_limit')
+        if recipes_limit is None:
+            return None
+        if not recipes_limit.isdecimal():
+            raise exceptions.ValidationError(
+                'recipes_limit должен быть неотрицательным целым числом.'
+            )
+        return int(recipes_limit)
+
+    def get_follow_serializer_context(self, request, follows):
+        return {
+            'request': request,
+            'author_recipes': get_author_recipes(
+                [follow.author_id for follow in follows],
+                self.get_recipes_limit(request)
+            ),
+        }
+
     @action(
         detail=False,
         methods=('get',),
@@ -138,11 +264,17 @@ class UsersViewSet(UserViewSet):
         serializer_class=FollowSerializer
     )
     def subscriptions(self, request):
+        self.get_recipes_limit(request)
         user = self.request.user
-        queryset = Follow.objects.filter(user=user)
+        queryset = self.get_follow_queryset(user)
         page = self.paginate_queryset(queryset)
+        prefetch_user_relations(
+            request, author_ids=[follow.author_id for follow in page]
+        )
         serializer = self.get_serializer(
-            page, many=True, context={'request': request}
+            page,
+            many=True,
+            context=self.get_follow_serializer_context(request, page)
         )
         return self.get_paginated_response(serializer.data)
 
@@ -155,14 +287,20 @@ class UsersViewSet(UserViewSet):
         user = request.user
         author = get_object_or_404(User, id=id)
         if request.method == 'POST':
+            self.get_recipes_limit(request)
             if request.user.id == author.id:
                 return ValidationError(
                     'Вы не можете подписаться на свой аккаунт'
                 )
             else:
+                follow = Follow.objects.create(user=user, author=author)
+                invalidate_user_relations(request)
+                follow = self.get_follow_queryset(user).get(id=follow.id)
                 serializer = self.get_serializer(
-                    Follow.objects.create(user=request.user, author=author),
-                    context={'request': request},
+                    follow,
+                    context=self.get_follow_serializer_context(
+                        request, (follow,)
+                    ),
                 )
                 return Response(
                     serializer.data, status=status.HTTP_201_CREATED
@@ -172,6 +310,17 @@ class UsersViewSet(UserViewSet):
                 Follow, user=user, author=author
             )
             followed_user.delete()
+            invalidate_user_relations(request)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class MetricsView(APIView):
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return HttpResponse(
+            render_metrics(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
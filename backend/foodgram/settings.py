@@ -1,5 +1,6 @@
 import os
 
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -30,6 +31,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.InstrumentationMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,8 +72,65 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
         'PORT': os.getenv('DB_PORT', default=5432),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
+        'CONN_HEALTH_CHECKS': os.getenv(
+            'DB_CONN_HEALTH_CHECKS', default='true'
+        ).lower() == 'true',
+        'CONN_HEALTH_CHECK_AGE': float(
+            os.getenv('DB_CONN_HEALTH_CHECK_AGE', default=30)
+        ),
+    }
+}
+if (os.getenv('DB_POOL', default='false').lower() == 'true'
+        and DATABASES['default']['ENGINE'].endswith('postgresql')):
+    DATABASES['default'].update(
+        ENGINE='api.backends.postgresql_pool',
+        CONN_MAX_AGE=0,
+        POOL={
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', default=10)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', default=30)),
+        },
+    )
+
+DATABASE_REPLICAS = []
+for index, replica in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', default='').split(','))
+):
+    alias = f'replica{index}'
+    replica_setting = (
+        'NAME' if DATABASES['default']['ENGINE'].endswith('sqlite3')
+        else 'HOST'
+    )
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        replica_setting: replica.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['api.db_routers.PrimaryReplicaRouter']
+DATABASE_REPLICA_STICKY_SECONDS = int(
+    os.getenv('DB_REPLICA_STICKY_SECONDS', default=5)
+)
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+        'TIMEOUT': int(os.getenv('CACHE_TIMEOUT', default=300)),
     }
 }
+CACHE_SHARED = not CACHES['default']['BACKEND'].endswith(
+    ('LocMemCache', 'DummyCache')
+)
+if DATABASE_REPLICAS and not CACHE_SHARED:
+    raise ImproperlyConfigured(
+        'DB_REPLICAS требует общего для всех воркеров кеша в CACHE_BACKEND: '
+        'иначе чтение после записи может уйти на реплику.'
+    )
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -103,12 +163,53 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+QUERY_BUDGET = int(os.getenv('QUERY_BUDGET', default=0))
+
+USER_RELATIONS_CACHE_TIMEOUT = int(
+    os.getenv('USER_RELATIONS_CACHE_TIMEOUT', default=0)
+)
+TOKEN_AUTH_CACHE_TIMEOUT = int(
+    os.getenv(
+        'TOKEN_AUTH_CACHE_TIMEOUT', default=60 if CACHE_SHARED else 0
+    )
+)
+
+INGREDIENT_INDEX_TIMEOUT = int(
+    os.getenv('INGREDIENT_INDEX_TIMEOUT', default=300)
+)
+RECIPE_SEARCH_INDEX_TIMEOUT = int(
+    os.getenv('RECIPE_SEARCH_INDEX_TIMEOUT', default=300)
+)
+RECIPE_INGREDIENT_INDEX_TIMEOUT = int(
+    os.getenv('RECIPE_INGREDIENT_INDEX_TIMEOUT', default=300)
+)
+
+RECIPE_FAST_SERIALIZATION = os.getenv(
+    'RECIPE_FAST_SERIALIZATION', default='false'
+).lower() == 'true'
+
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', default=2))
+RECIPE_IMAGE_STAGING_ROOT = os.getenv(
+    'RECIPE_IMAGE_STAGING_ROOT', default=os.path.join(BASE_DIR, 'uploads')
+)
+RECIPE_IMAGE_THUMBNAILS = {
+    'small': 300,
+    'medium': 600,
+}
+RECIPE_IMAGE_LIST_THUMBNAIL = 'medium'
+RECIPE_IMAGE_LIST_FORMAT = 'webp'
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
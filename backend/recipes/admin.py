@@ -1,11 +1,39 @@
+from functools import partial
+
+from api.images import schedule_image_processing, stage_image
+from django.conf import settings
 from django.contrib import admin
+from django.db import transaction
 
+from .admin_utils import (AutocompleteFilter, AutocompleteFilterMixin,
+                          EstimatedCountPaginator)
 from .models import Ingredient, Recipe, RecipeIngredient, RecipeTag, Tag
 
 
+class AuthorFilter(AutocompleteFilter):
+    title = 'автору'
+    field_name = 'author'
+
+
+class RecipeIngredientsFilter(AutocompleteFilter):
+    title = 'ингредиенту'
+    field_name = 'ingredients'
+
+
+class IngredientFilter(AutocompleteFilter):
+    title = 'ингредиенту'
+    field_name = 'ingredient'
+
+
+class RecipeFilter(AutocompleteFilter):
+    title = 'рецепту'
+    field_name = 'recipe'
+
+
 class RecipeIngredientInLine(admin.TabularInline):
     model = RecipeIngredient
     extra = 1
+    autocomplete_fields = ('ingredient',)
 
 
 class RecipeTagInLine(admin.TabularInline):
@@ -14,24 +42,55 @@ class RecipeTagInLine(admin.TabularInline):
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     list_display = (
-        'id', 'name', 'author', 'text', 'pub_date', 'get_in_favorites'
+        'id', 'name', 'author', 'text', 'pub_date', 'get_in_favorites',
+        'cart_count',
     )
+    list_select_related = ('author',)
 
     search_fields = (
-        'name', 'cooking_time', 'author',
+        'name', 'cooking_time', 'author__username',
     )
 
     list_filter = (
-        'name', 'author', 'tags', 'pub_date'
+        AuthorFilter, RecipeIngredientsFilter, 'tags', 'pub_date'
     )
+    autocomplete_fields = ('author',)
     inlines = (RecipeIngredientInLine, RecipeTagInLine,)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_in_favorites(self, obj):
-        return obj.favorite_recipe.count()
+        return obj.favorites_count
 
     get_in_favorites.short_description = 'В избранных'
+    get_in_favorites.admin_order_field = 'favorites_count'
+
+    def save_model(self, request, obj, form, change):
+        image_changed = 'image' in form.changed_data
+        if image_changed:
+            obj.image = stage_image(
+                settings.RECIPE_IMAGE_STAGING_ROOT, form.cleaned_data['image']
+            )
+            obj.image_processed = False
+        if not change:
+            super().save_model(request, obj, form, change)
+        else:
+            concrete_fields = {
+                field.name for field in obj._meta.concrete_fields
+            }
+            update_fields = [
+                name for name in form.changed_data if name in concrete_fields
+            ]
+            if image_changed:
+                update_fields.append('image_processed')
+            if update_fields:
+                obj.save(update_fields=update_fields)
+        if image_changed:
+            transaction.on_commit(
+                partial(schedule_image_processing, obj.image.name)
+            )
 
 
 @admin.register(Tag)
@@ -48,10 +107,17 @@ class IngredientAdmin(admin.ModelAdmin):
     list_display = (
         'id', 'name', 'measurement_unit',
     )
-    list_filter = ('name',)
+    search_fields = ('^name',)
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(RecipeIngredient)
-class RecipeIngredientAdmin(admin.ModelAdmin):
+class RecipeIngredientAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     list_display = ('recipe', 'ingredient', 'amount')
+    list_select_related = ('recipe', 'ingredient')
+    list_filter = (RecipeFilter, IngredientFilter)
+    autocomplete_fields = ('recipe', 'ingredient')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
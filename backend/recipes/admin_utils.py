@@ -0,0 +1,102 @@
+from django import forms
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    estimate_threshold = ESTIMATED_COUNT_THRESHOLD
+
+    def get_estimate(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql' or queryset.query.where:
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        return int(row[0]) if row else None
+
+    @cached_property
+    def count(self):
+        estimate = self.get_estimate()
+        if estimate is not None and estimate > self.estimate_threshold:
+            return estimate
+        return self.object_list.values('pk').order_by().count()
+
+
+class AutocompleteFilter(admin.SimpleListFilter):
+    template = 'admin/autocomplete_filter.html'
+    field_name = None
+
+    def __init__(self, request, params, model, model_admin):
+        self.parameter_name = f'{self.field_name}__id__exact'
+        super().__init__(request, params, model, model_admin)
+        self.field = self.get_form_field(model_admin)
+
+    @classmethod
+    def get_form_field(cls, model_admin):
+        remote_field = model_admin.model._meta.get_field(
+            cls.field_name
+        ).remote_field
+        return forms.ModelChoiceField(
+            queryset=remote_field.model._default_manager.all(),
+            required=False,
+            widget=AutocompleteSelect(remote_field, model_admin.admin_site),
+        )
+
+    @classmethod
+    def get_media(cls, model_admin):
+        return cls.get_form_field(model_admin).widget.media + forms.Media(
+            js=(
+                'admin/js/jquery.init.js',
+                'recipes/js/autocomplete_filter.js',
+            )
+        )
+
+    def has_output(self):
+        return True
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        try:
+            return queryset.filter(**{self.parameter_name: self.value()})
+        except (ValueError, ValidationError) as error:
+            raise IncorrectLookupParameters(error)
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(
+                remove=[self.parameter_name]
+            ),
+            'display': _('All'),
+        }
+
+    def render_widget(self):
+        return self.field.widget.render(self.parameter_name, self.value())
+
+
+class AutocompleteFilterMixin:
+    @property
+    def media(self):
+        media = super().media
+        for list_filter in self.list_filter:
+            if (isinstance(list_filter, type)
+                    and issubclass(list_filter, AutocompleteFilter)):
+                media += list_filter.get_media(self)
+        return media
@@ -0,0 +1,151 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.caching import invalidate_ingredients
+from recipes.models import Ingredient
+
+DEFAULT_PATH = os.path.join(
+    os.path.dirname(settings.BASE_DIR), 'data', 'ingredients.csv'
+)
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as file:
+        for row in csv.reader(file):
+            if row:
+                yield row[0].strip(), row[1].strip()
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as file:
+        for item in json.load(file):
+            yield item['name'].strip(), item['measurement_unit'].strip()
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
+
+class RowsFile:
+    def __init__(self, rows):
+        self.lines = self.get_lines(rows)
+        self.buffer = ''
+
+    def get_lines(self, rows):
+        writer = csv.writer(self)
+        for row in rows:
+            yield writer.writerow(row)
+
+    def write(self, value):
+        return value
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.buffer += line
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+class Command(BaseCommand):
+    help = 'Загружает ингредиенты из CSV- или JSON-файла.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=DEFAULT_PATH,
+            help='Путь к файлу ingredients.csv или ingredients.json.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки для bulk_create.',
+        )
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Не использовать COPY даже на PostgreSQL.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in READERS:
+            raise CommandError(
+                f'Неподдерживаемый формат файла {extension}, '
+                f'ожидается .csv или .json.'
+            )
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден.')
+        rows = READERS[extension](path)
+
+        start = time.perf_counter()
+        initial_count = Ingredient.objects.count()
+        if connection.vendor == 'postgresql' and not options['no_copy']:
+            processed = self.copy_rows(rows)
+        else:
+            processed = self.bulk_create_rows(rows, options['batch_size'])
+        created = Ingredient.objects.count() - initial_count
+        duration = time.perf_counter() - start
+        if created:
+            invalidate_ingredients()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано строк: {processed}, добавлено ингредиентов: '
+            f'{created} за {duration:.2f} с '
+            f'({processed / max(duration, 1e-6):.0f} строк/с).'
+        ))
+
+    def bulk_create_rows(self, rows, batch_size):
+        processed = 0
+        while True:
+            batch = [
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in islice(rows, batch_size)
+            ]
+            if not batch:
+                return processed
+            Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+            processed += len(batch)
+
+    def copy_rows(self, rows):
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        counter = {'processed': 0}
+
+        def counted(rows):
+            for row in rows:
+                counter['processed'] += 1
+                yield row
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredients_import '
+                '(name varchar(100), measurement_unit varchar(255)) '
+                'ON COMMIT DROP'
+            )
+            cursor.copy_expert(
+                'COPY ingredients_import FROM STDIN WITH (FORMAT csv)',
+                RowsFile(counted(rows)),
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                f'SELECT DISTINCT name, measurement_unit '
+                f'FROM ingredients_import '
+                f'ON CONFLICT DO NOTHING'
+            )
+        return counter['processed']
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Q
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики избранного и списков покупок у рецептов '
+        'и проверяет их расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить расхождения, не пересчитывая счётчики.',
+        )
+
+    def get_drift(self):
+        return Recipe.objects.calculate_counters().filter(
+            ~Q(favorites_count=F('expected_favorites_count'))
+            | ~Q(cart_count=F('expected_cart_count'))
+        ).count()
+
+    def handle(self, *args, **options):
+        drift = self.get_drift()
+        if options['check']:
+            if drift:
+                raise CommandError(
+                    f'Найдено рецептов с неверными счётчиками: {drift}.'
+                )
+            self.stdout.write(self.style.SUCCESS(
+                'Счётчики рецептов совпадают с избранным и корзинами.'
+            ))
+            return
+        Recipe.objects.rebuild_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики рецептов пересчитаны, '
+            f'исправлено рецептов: {drift}.'
+        ))
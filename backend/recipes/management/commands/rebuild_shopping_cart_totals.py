@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingCartTotals
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает итоги списков покупок и проверяет их расхождения.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить расхождения, не пересчитывая таблицу.',
+        )
+
+    def get_drift(self):
+        expected = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingCartTotals.objects.calculate()
+        }
+        actual = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingCartTotals.objects.values_list(
+                'user_id', 'ingredient_id', 'amount'
+            )
+        }
+        return [
+            key for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        ]
+
+    def handle(self, *args, **options):
+        drift = self.get_drift()
+        if options['check']:
+            if drift:
+                raise CommandError(
+                    f'Найдено расхождений в итогах списков покупок: '
+                    f'{len(drift)}.'
+                )
+            self.stdout.write(self.style.SUCCESS(
+                'Итоги списков покупок совпадают с корзинами.'
+            ))
+            return
+        ShoppingCartTotals.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Итоги списков покупок пересчитаны, '
+            f'исправлено расхождений: {len(drift)}.'
+        ))
@@ -0,0 +1,54 @@
+# Generated by Django 2.2.16 on 2026-10-18 22:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_shopping_cart_totals(apps, schema_editor):
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingCartTotals = apps.get_model('recipes', 'ShoppingCartTotals')
+    totals = RecipeIngredient.objects.filter(
+        recipe__shopping_cart_recipe__isnull=False
+    ).values(
+        'recipe__shopping_cart_recipe__user', 'ingredient'
+    ).annotate(total_amount=models.Sum('amount')).values_list(
+        'recipe__shopping_cart_recipe__user', 'ingredient', 'total_amount'
+    )
+    ShoppingCartTotals.objects.bulk_create(
+        ShoppingCartTotals(
+            user_id=user_id, ingredient_id=ingredient_id, amount=amount
+        )
+        for user_id, ingredient_id, amount in totals
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0004_auto_20220908_1359'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartTotals',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField(default=0, verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_totals', to='recipes.Ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_totals', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Итог списка покупок',
+                'verbose_name_plural': 'Итоги списков покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcarttotals',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_cart_totals'),
+        ),
+        migrations.RunPython(
+            fill_shopping_cart_totals, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 2.2.16 on 2026-10-18 22:14
+
+from django.db import migrations, models
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingCartTotals = apps.get_model('recipes', 'ShoppingCartTotals')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(
+        original_id=models.Min('id'), total=models.Count('id')
+    ).filter(total__gt=1)
+    if not duplicates:
+        return
+    for group in duplicates:
+        original_id = group['original_id']
+        doubles = Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(id=original_id)
+        for double in doubles:
+            used_recipes = RecipeIngredient.objects.filter(
+                ingredient_id=original_id
+            ).values('recipe_id')
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                ingredient=double, recipe_id__in=used_recipes
+            ):
+                RecipeIngredient.objects.filter(
+                    ingredient_id=original_id,
+                    recipe_id=recipe_ingredient.recipe_id
+                ).update(amount=models.F('amount') + recipe_ingredient.amount)
+                recipe_ingredient.delete()
+            RecipeIngredient.objects.filter(ingredient=double).update(
+                ingredient_id=original_id
+            )
+            double.delete()
+
+    ShoppingCartTotals.objects.all().delete()
+    totals = RecipeIngredient.objects.filter(
+        recipe__shopping_cart_recipe__isnull=False
+    ).values(
+        'recipe__shopping_cart_recipe__user', 'ingredient'
+    ).annotate(total_amount=models.Sum('amount')).values_list(
+        'recipe__shopping_cart_recipe__user', 'ingredient', 'total_amount'
+    )
+    ShoppingCartTotals.objects.bulk_create(
+        ShoppingCartTotals(
+            user_id=user_id, ingredient_id=ingredient_id, amount=amount
+        )
+        for user_id, ingredient_id, amount in totals
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_name_measurement_unit'),
+        ),
+    ]
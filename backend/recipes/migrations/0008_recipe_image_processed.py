@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 22:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_unique_ingredient_name_measurement_unit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_processed',
+            field=models.BooleanField(default=False, verbose_name='Миниатюры изображения готовы'),
+        ),
+    ]
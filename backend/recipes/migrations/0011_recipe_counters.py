@@ -0,0 +1,48 @@
+# Generated by Django 2.2.16 on 2026-10-18 22:26
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_recipe_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    counters = {
+        'favorites_count': apps.get_model('recipes', 'FavoriteRecipe'),
+        'cart_count': apps.get_model('recipes', 'ShoppingCart'),
+    }
+    Recipe.objects.update(**{
+        counter: Coalesce(models.Subquery(
+            model.objects.filter(
+                recipe=models.OuterRef('pk')
+            ).order_by().values('recipe').annotate(
+                total=models.Count('id')
+            ).values('total'),
+            output_field=models.PositiveIntegerField()
+        ), 0)
+        for counter, model in counters.items()
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['favorites_count', 'cart_count', 'pub_date', 'id'], name='recipe_popularity_idx'),
+        ),
+        migrations.RunPython(fill_recipe_counters, migrations.RunPython.noop),
+    ]
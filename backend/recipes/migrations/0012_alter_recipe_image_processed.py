@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 23:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image_processed',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Миниатюры изображения готовы'),
+        ),
+    ]
@@ -1,9 +1,14 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.core import validators
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 
 from users.models import User
 
+from .storage import ContentAddressedStorage
+
 
 class Tag(models.Model):
     name = models.CharField(
@@ -47,11 +52,44 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_name_measurement_unit',
+            )
+        ]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
 
 
+class RecipeManager(models.Manager):
+    def get_counter_subqueries(self):
+        return {
+            counter: Coalesce(Subquery(
+                model.objects.filter(
+                    recipe=OuterRef('pk')
+                ).order_by().values('recipe').annotate(
+                    total=Count('id')
+                ).values('total'),
+                output_field=models.PositiveIntegerField()
+            ), 0)
+            for counter, model in (
+                ('favorites_count', FavoriteRecipe),
+                ('cart_count', ShoppingCart),
+            )
+        }
+
+    def calculate_counters(self):
+        return self.annotate(**{
+            f'expected_{counter}': subquery
+            for counter, subquery in self.get_counter_subqueries().items()
+        })
+
+    def rebuild_counters(self):
+        return self.update(**self.get_counter_subqueries())
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -68,10 +106,17 @@ class Recipe(models.Model):
 
     image = models.ImageField(
         upload_to='recipes/',
+        storage=ContentAddressedStorage(),
         blank=False,
         verbose_name='Изображение рецепта',
     )
 
+    image_processed = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Миниатюры изображения готовы',
+    )
+
     text = models.CharField(
         max_length=255,
         blank=False,
@@ -102,10 +147,39 @@ class Recipe(models.Model):
         verbose_name='Дата публикации рецепта'
     )
 
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор'
+    )
+
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном',
+    )
+
+    cart_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В списках покупок',
+    )
+
+    objects = RecipeManager()
+
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('pub_date', 'id'), name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('favorites_count', 'cart_count', 'pub_date', 'id'),
+                name='recipe_popularity_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -218,3 +292,92 @@ class ShoppingCart(models.Model):
                 name='unique_recipe_in_shopping_cart',
             )
         ]
+
+
+class ShoppingCartTotalsManager(models.Manager):
+    def apply(self, user_ids, amounts):
+        user_ids = list(user_ids)
+        amounts = {
+            ingredient_id: amount
+            for ingredient_id, amount in amounts.items() if amount
+        }
+        if not user_ids or not amounts:
+            return
+        with transaction.atomic():
+            self.bulk_create([
+                self.model(
+                    user_id=user_id, ingredient_id=ingredient_id, amount=0
+                )
+                for user_id in user_ids for ingredient_id in amounts
+            ], ignore_conflicts=True)
+            for ingredient_id, amount in amounts.items():
+                self.filter(
+                    user_id__in=user_ids, ingredient_id=ingredient_id
+                ).update(amount=F('amount') + amount)
+            self.filter(user_id__in=user_ids, amount__lte=0).delete()
+
+    def add_recipe(self, user, recipe):
+        self.apply((user.id,), dict(
+            recipe.recipe.values_list('ingredient_id', 'amount')
+        ))
+
+    def remove_recipe(self, user_ids, recipe):
+        self.apply(user_ids, {
+            ingredient_id: -amount
+            for ingredient_id, amount
+            in recipe.recipe.values_list('ingredient_id', 'amount')
+        })
+
+    def calculate(self):
+        return RecipeIngredient.objects.filter(
+            recipe__shopping_cart_recipe__isnull=False
+        ).values(
+            'recipe__shopping_cart_recipe__user', 'ingredient'
+        ).annotate(total_amount=Sum('amount')).values_list(
+            'recipe__shopping_cart_recipe__user',
+            'ingredient',
+            'total_amount'
+        )
+
+    def rebuild(self):
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(
+                self.model(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    amount=amount
+                )
+                for user_id, ingredient_id, amount in self.calculate()
+            )
+
+
+class ShoppingCartTotals(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals',
+        verbose_name='Ингредиент',
+    )
+    amount = models.IntegerField(
+        default=0,
+        verbose_name='Количество'
+    )
+
+    objects = ShoppingCartTotalsManager()
+
+    class Meta:
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_cart_totals',
+            )
+        ]
@@ -0,0 +1,16 @@
+(function($) {
+    'use strict';
+    $(function() {
+        $('.autocomplete-filter select').on('change', function() {
+            var $filter = $(this).closest('.autocomplete-filter');
+            var queryString = $filter.data('query-string');
+            var value = $(this).val();
+            if (value) {
+                queryString += (queryString === '?' ? '' : '&')
+                    + encodeURIComponent($filter.data('parameter'))
+                    + '=' + encodeURIComponent(value);
+            }
+            window.location.search = queryString;
+        });
+    });
+}(django.jQuery));
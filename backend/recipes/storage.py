@@ -0,0 +1,50 @@
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def get_content_hash(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def get_content_addressed_name(name, digest):
+    directory = os.path.dirname(name)
+    extension = os.path.splitext(name)[1].lower()
+    return os.path.join(directory, f'{digest}{extension}')
+
+
+def is_content_addressed_name(name):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return len(stem) == 64 and all(
+        symbol in '0123456789abcdef' for symbol in stem
+    )
+
+
+def write_file_atomically(path, data):
+    temporary_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    with open(temporary_path, 'wb') as file:
+        file.write(data)
+    os.replace(temporary_path, path)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        name = get_content_addressed_name(name, get_content_hash(content))
+        if not self.exists(name):
+            temporary_name = super()._save(
+                f'{name}.{uuid.uuid4().hex}.tmp', content
+            )
+            os.replace(self.path(temporary_name), self.path(name))
+        return name
@@ -1,13 +1,31 @@
 from django.contrib import admin
+from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.admin_utils import EstimatedCountPaginator
+from recipes.models import Recipe
 
 from .models import Follow, User
 
 
+def count_related(model, field_name):
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field_name: OuterRef('pk')}
+        ).order_by().values(field_name).annotate(
+            total=Count('pk')
+        ).values('total'),
+        output_field=models.IntegerField()
+    ), 0)
+
+
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
     list_display = (
         'id', 'username', 'email',
         'first_name', 'last_name', 'date_joined',
+        'get_recipes_count', 'get_followers_count',
     )
 
     search_fields = (
@@ -15,11 +33,35 @@ class UserAdmin(admin.ModelAdmin):
     )
 
     list_filter = (
-        'email', 'first_name', 'date_joined',
+        'is_active', 'is_staff', 'date_joined',
     )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            recipes_count=count_related(Recipe, 'author'),
+            followers_count=count_related(Follow, 'author'),
+        )
+
+    def get_recipes_count(self, obj):
+        return obj.recipes_count
+
+    get_recipes_count.short_description = 'Рецептов'
+    get_recipes_count.admin_order_field = 'recipes_count'
+
+    def get_followers_count(self, obj):
+        return obj.followers_count
+
+    get_followers_count.short_description = 'Подписчиков'
+    get_followers_count.admin_order_field = 'followers_count'
 
 
 @admin.register(Follow)
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'author',)
-    search_fields = ('user', 'author',)
+    list_select_related = ('user', 'author')
+    search_fields = ('user__username', 'author__username',)
+    autocomplete_fields = ('user', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False